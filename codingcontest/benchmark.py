@@ -0,0 +1,204 @@
+import json
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from collections.abc import Iterator
+from contextlib import contextmanager, suppress
+from pathlib import Path
+from typing import Any
+
+import typer
+from loguru import logger
+
+from codingcontest.mock_server import MockContest, MockLevel, serve
+
+TEMPLATE_DIR = Path(__file__).parent / "template"
+
+
+def benchmark_cli(  # noqa: PLR0913
+    repeat: int = typer.Option(3, help="Number of full contest cycles"),  # noqa: B008
+    levels: int = typer.Option(2, help="Number of levels per cycle"),  # noqa: B008
+    stages: int = typer.Option(5, help="Number of stages per level"),  # noqa: B008
+    input_size: int = typer.Option(100_000, help="Approximate bytes per input"),  # noqa: B008
+    latency: float = typer.Option(0.05, help="Seconds added to every response"),  # noqa: B008
+    failure_rate: float = typer.Option(  # noqa: B008
+        0.0, help="Fraction of api requests answered with 503"
+    ),
+    download_drop_rate: float = typer.Option(  # noqa: B008
+        0.0, help="Fraction of downloads cut off halfway"
+    ),
+    session_max_requests: int = typer.Option(  # noqa: B008
+        0, help="Api requests after which a session expires (0: never), exercises the re-login"
+    ),
+    expired_session_redirect: bool = typer.Option(  # noqa: B008, FBT001
+        default=False, help="Redirect expired sessions to the login page, instead of a 401"
+    ),
+    output: Path = typer.Option(None, help="Write the results as json to this file"),  # noqa: B008
+    baseline: Path = typer.Option(  # noqa: B008
+        None, help="Results json of an earlier run to compare against"
+    ),
+    tolerance: float = typer.Option(  # noqa: B008
+        0.2, help="Allowed relative slowdown of a phase median against the baseline"
+    ),
+) -> None:
+    """Time full level cycles against a local mock catcoder server."""
+    logger.remove()
+    logger.add(sys.stderr, level="WARNING")
+    config = {
+        "repeat": repeat,
+        "levels": levels,
+        "stages": stages,
+        "input_size": input_size,
+        "latency": latency,
+        "failure_rate": failure_rate,
+        "download_drop_rate": download_drop_rate,
+        "session_max_requests": session_max_requests,
+        "expired_session_redirect": expired_session_redirect,
+    }
+    results = benchmark(
+        repeat=repeat,
+        levels=levels,
+        stages=stages,
+        input_size=input_size,
+        latency=latency,
+        failure_rate=failure_rate,
+        download_drop_rate=download_drop_rate,
+        session_max_requests=session_max_requests,
+        expired_session_redirect=expired_session_redirect,
+    )
+    results["config"] = config
+    for phase, stats in results["phases"].items():
+        typer.echo(
+            f"{phase:>20}: median {stats['median']:.3f}s "
+            f"(min {stats['min']:.3f}s, max {stats['max']:.3f}s, n={len(stats['samples'])})"
+        )
+    if output is not None:
+        output.write_text(json.dumps(results, indent=2), encoding="utf-8")
+    if baseline is not None and not compare(
+        results, json.loads(baseline.read_text(encoding="utf-8")), tolerance=tolerance
+    ):
+        raise typer.Exit(code=1)
+
+
+def benchmark(
+    *,
+    repeat: int,
+    levels: int,
+    stages: int,
+    input_size: int,
+    latency: float,
+    failure_rate: float,
+    download_drop_rate: float,
+    session_max_requests: int,
+    expired_session_redirect: bool,
+) -> dict[str, Any]:
+    """Run repeat contest cycles: login, level info, next level, submit + advance per level.
+
+    The level directories are created in a temporary directory (via CCC_ROOT_DIR), git is
+    disabled. With session_max_requests, the contest is only completed if the expired
+    sessions are renewed by a login and the rejected requests repeated. Returns the timings
+    of each phase and the number of requests per endpoint.
+    """
+    samples: dict[str, list[float]] = defaultdict(list)
+    request_counts: dict[str, int] = defaultdict(int)
+    with tempfile.TemporaryDirectory(prefix="ccc_benchmark_") as tmp:
+        root_dir = Path(tmp) / "codingcontest"
+        shutil.copytree(TEMPLATE_DIR, root_dir / "template")
+        os.environ["CCC_ROOT_DIR"] = str(root_dir)
+        os.environ["CCC_SESSION_CACHE"] = str(Path(tmp) / "session.json")
+        os.environ["CCC_GIT_MODE"] = "none"
+        # Imported late, as the utils module reads CCC_ROOT_DIR on import
+        from codingcontest.catcoder import CatCoder
+        from codingcontest.next_level import next_level
+        from codingcontest.submit_solutions import submit_solutions
+
+        rng = random.Random(0)
+        for _ in range(repeat):
+            for level_path in root_dir.glob("level*"):
+                shutil.rmtree(level_path)
+            Path(os.environ["CCC_SESSION_CACHE"]).unlink(missing_ok=True)
+            contest = MockContest(
+                levels=[
+                    MockLevel.generate(nr, nr_stages=stages, input_size=input_size, rng=rng)
+                    for nr in range(1, levels + 1)
+                ],
+                latency=latency,
+                failure_rate=failure_rate,
+                download_drop_rate=download_drop_rate,
+                session_max_requests=session_max_requests,
+                expired_session_redirect=expired_session_redirect,
+            )
+            with serve(contest) as server:
+                os.environ.update(server.env())
+                cycle_start = time.perf_counter()
+                with timed(samples["login"]):
+                    catcoder = CatCoder()
+                with timed(samples["level_info"]):
+                    catcoder.current_level_info()
+                with timed(samples["next_level"]):
+                    next_level(catcoder=catcoder)
+                for level_nr, level in enumerate(contest.levels, start=1):
+                    for stage_name, (_, expected) in level.stages.items():
+                        out_path = root_dir / f"level{level_nr}" / "out" / f"{stage_name}.out"
+                        out_path.write_bytes(expected)
+                    # typer.Exit after the last level
+                    with timed(samples["submit_and_advance"]), suppress(typer.Exit):
+                        submit_solutions(catcoder=catcoder)
+                samples["cycle"].append(time.perf_counter() - cycle_start)
+                assert contest.level_idx == len(contest.levels), "Contest was not completed"
+                assert (
+                    contest.expired_sessions > 0 or not session_max_requests
+                ), "No session expired, lower session_max_requests"
+            for endpoint, count in contest.request_counts.items():
+                request_counts[endpoint] += count
+    return {
+        "phases": {
+            phase: {
+                "median": statistics.median(values),
+                "min": min(values),
+                "max": max(values),
+                "samples": values,
+            }
+            for phase, values in samples.items()
+        },
+        "requests_per_cycle": {
+            endpoint: count / repeat for endpoint, count in sorted(request_counts.items())
+        },
+    }
+
+
+@contextmanager
+def timed(samples: list[float]) -> Iterator[None]:
+    """Append the elapsed seconds of the with block to samples."""
+    start = time.perf_counter()
+    yield
+    samples.append(time.perf_counter() - start)
+
+
+def compare(results: dict[str, Any], baseline: dict[str, Any], *, tolerance: float) -> bool:
+    """Log phases which got slower than baseline by more than tolerance, True if none did."""
+    is_ok = True
+    for phase, stats in results["phases"].items():
+        if phase not in baseline["phases"]:
+            continue
+        baseline_median = baseline["phases"][phase]["median"]
+        if stats["median"] > baseline_median * (1 + tolerance):
+            logger.error(
+                f"Regression in {phase}: median {stats['median']:.3f}s, "
+                f"baseline {baseline_median:.3f}s"
+            )
+            is_ok = False
+    return is_ok
+
+
+def run() -> None:
+    typer.run(benchmark_cli)
+
+
+if __name__ == "__main__":
+    run()
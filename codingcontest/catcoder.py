@@ -1,17 +1,89 @@
+import json
 import os
+import random
 import re
-from dataclasses import dataclass
+import threading
+import time
+from collections.abc import Iterator
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
 from http import HTTPStatus
 from io import BufferedReader
 from pathlib import Path
-from typing import Any, NamedTuple
+from typing import TYPE_CHECKING, Any, NamedTuple
 
-import requests
 from dotenv import load_dotenv
 from loguru import logger
 
+from codingcontest.metrics import METRICS, endpoint_of
+from codingcontest.stream_unzip import StreamingUnzipper
+
+if TYPE_CHECKING:  # requests is imported with the first session, see CatCoder.new_session
+    import requests
+
 load_dotenv()
 
+SESSION_CACHE_PATH = Path(
+    os.getenv("CCC_SESSION_CACHE") or Path(__file__).parent.parent / ".catcoder_session.json"
+)
+SESSION_CACHE_TTL = int(os.getenv("CCC_SESSION_TTL", str(8 * 60 * 60)))  # seconds
+HTTP_POOL_SIZE = int(os.getenv("CCC_HTTP_POOL_SIZE", "16"))  # keep-alive connections per host
+HTTP_TIMEOUT = (
+    float(os.getenv("CCC_HTTP_CONNECT_TIMEOUT", "5")),
+    float(os.getenv("CCC_HTTP_READ_TIMEOUT", "60")),
+)  # seconds
+HTTP_RETRIES = int(os.getenv("CCC_HTTP_RETRIES", "3"))
+HTTP_BACKOFF = float(os.getenv("CCC_HTTP_BACKOFF", "0.5"))  # seconds, doubled on each retry
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}
+RETRYABLE_STATUS_CODES = {
+    HTTPStatus.TOO_MANY_REQUESTS,
+    HTTPStatus.INTERNAL_SERVER_ERROR,
+    HTTPStatus.BAD_GATEWAY,
+    HTTPStatus.SERVICE_UNAVAILABLE,
+    HTTPStatus.GATEWAY_TIMEOUT,
+}
+# The server did not process the request for these, so they can be repeated for any method
+UNPROCESSED_STATUS_CODES = {HTTPStatus.TOO_MANY_REQUESTS, HTTPStatus.SERVICE_UNAVAILABLE}
+DOWNLOAD_TIMEOUT = 60  # seconds without receiving data
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+DOWNLOAD_ATTEMPTS = 5
+
+
+def is_retryable_error(method: str, error: "requests.RequestException") -> bool:
+    """Check if a request which failed with error may be sent again."""
+    import requests
+    import urllib3
+
+    if method.upper() in IDEMPOTENT_METHODS:
+        return isinstance(error, requests.ConnectionError | requests.Timeout)
+    # Only safe if the request never reached the server
+    return isinstance(error, requests.ConnectTimeout) or (
+        isinstance(error, requests.ConnectionError)
+        and isinstance(error.args[0] if error.args else None, urllib3.exceptions.MaxRetryError)
+        and isinstance(error.args[0].reason, urllib3.exceptions.NewConnectionError)
+    )
+
+
+def is_retryable_status(method: str, status_code: int) -> bool:
+    if method.upper() in IDEMPOTENT_METHODS:
+        return status_code in RETRYABLE_STATUS_CODES
+    return status_code in UNPROCESSED_STATUS_CODES
+
+
+def body_size(request: Any) -> int:  # noqa: ANN401
+    """Bytes of the body of a requests.PreparedRequest (or None), for the metrics."""
+    body = getattr(request, "body", None)
+    if isinstance(body, str):
+        return len(body.encode())
+    return len(body) if isinstance(body, bytes) else 0
+
+
+def backoff(attempt: int, reason: str) -> None:
+    """Sleep before retry number attempt, with full jitter exponential backoff."""
+    delay = random.uniform(0, HTTP_BACKOFF * 2 ** (attempt - 1))  # noqa: S311
+    logger.warning(f"{reason}, retry {attempt}/{HTTP_RETRIES} in {delay:.2f}s")
+    time.sleep(delay)
+
 
 class LevelInfo(NamedTuple):
     level_nr: int
@@ -24,10 +96,30 @@ class LevelInfo(NamedTuple):
     is_input_files: bool  # files or text fields for input?
     is_output_files: bool  # files or text fields for output?
 
+    @classmethod
+    def from_api(cls, input_info: dict[str, Any], level_state: dict[str, Any]) -> "LevelInfo":
+        """Build from the responses of CatCoder.input_info and CatCoder.level_state."""
+        assert len(input_info["tests"]) > 0
+        if input_info["tests"][0]["inputsDto"][0].get("name", None) is not None:
+            input_names = tuple(str(test["inputsDto"][0]["name"]) for test in input_info["tests"])
+        else:
+            input_names = tuple(str(idx) for idx in range(1, len(input_info["tests"]) + 1))
+        return cls(
+            level_nr=input_info["level"],
+            max_level_nr=level_state["nrOfLevels"],
+            is_contest_finished=level_state["gameFinished"],
+            input_names=input_names,
+            input_file_names=tuple(
+                str(test["inputsDto"][0]["input"]) for test in input_info["tests"]
+            ),
+            is_input_files=input_info["hasInputFile"],
+            is_output_files=input_info["fileSolution"],
+        )
+
 
 @dataclass
 class CatCoder:
-    session: requests.Session = requests.Session()
+    session: "requests.Session" = field(init=False)
     ccc_username: str = ""
     ccc_password: str = ""
     ccc_contest_id: str = ""
@@ -37,10 +129,18 @@ class CatCoder:
         self.ccc_password = os.getenv("CCC_PASSWORD", "")
         self.ccc_contest_id = os.getenv("CCC_CONTEST_ID", "")
         self.contest_domain = os.getenv("CCC_CONTEST_DOMAIN", "codingcontest.org")
+        self.catcoder_url = os.getenv(
+            "CCC_CATCODER_URL", f"https://catcoder.{self.contest_domain}"
+        )
+        self.register_url = os.getenv(
+            "CCC_REGISTER_URL", f"https://register.{self.contest_domain}"
+        )
         assert self.ccc_username
         assert self.ccc_password
         assert self.ccc_contest_id
-        self.login()
+        self.login_lock = threading.Lock()
+        if not self.load_session():
+            self.login()
 
     def request(  # noqa: PLR0913
         self,
@@ -49,23 +149,89 @@ class CatCoder:
         data: dict[str, str] | None = None,
         files: list[tuple[str, tuple[str, BufferedReader, str]]] | None = None,
         json: dict[str, Any] | None = None,
-    ) -> requests.Response:
-        logger.debug(f"{method}: {url}")
-        try:
-            res = self.session.request(method, url, data=data, files=files, json=json)
-        except (requests.RequestException, requests.ConnectionError) as e:
-            logger.warning(f"Got an exception during {method} {url}: {e}")
-            res = requests.Response()
-            res.status_code = HTTPStatus.INTERNAL_SERVER_ERROR
+        *,
+        relogin: bool = True,
+    ) -> "requests.Response":
+        """Send a request with the logged in session, raise ValueError if it did not succeed.
+
+        Failed requests are retried with jittered exponential backoff, unless retrying
+        could apply a non-idempotent request twice. If the server rejects the session,
+        we log in again (once) and repeat the request.
+        """
+        import requests
+
+        attempt = 0
+        endpoint = endpoint_of(url)
+        while True:
+            session = self.session
+            logger.debug(f"{method}: {url}")
+            for _, (_, fin, _) in files or []:
+                fin.seek(0)
+            start = time.perf_counter()
+            try:
+                res = session.request(
+                    method, url, data=data, files=files, json=json, timeout=HTTP_TIMEOUT
+                )
+            except requests.RequestException as e:
+                METRICS.record_request(
+                    endpoint,
+                    method,
+                    start=start,
+                    sent=body_size(e.request),
+                    error=type(e).__name__,
+                )
+                if attempt < HTTP_RETRIES and is_retryable_error(method, e):
+                    attempt += 1
+                    METRICS.record_retry(endpoint)
+                    backoff(attempt, f"{method} {url} failed with {e}")
+                    continue
+                msg = f"Got an exception during {method} {url}: {e}"
+                logger.warning(msg)
+                raise ValueError(msg) from e
+            METRICS.record_request(
+                endpoint,
+                method,
+                start=start,
+                sent=body_size(res.request),
+                received=len(res.content),
+                error=None if res.status_code == HTTPStatus.OK else f"status {res.status_code}",
+            )
+            if relogin and self.is_rejected_session(res):
+                logger.info("Session was rejected, logging in again")
+                self.relogin(rejected_session=session)
+                relogin = False
+                continue
+            if attempt < HTTP_RETRIES and is_retryable_status(method, res.status_code):
+                attempt += 1
+                METRICS.record_retry(endpoint)
+                backoff(attempt, f"{method} {url} returned status_code {res.status_code}")
+                continue
+            if res.status_code != HTTPStatus.OK:
+                msg = f"Received status_code {res.status_code} from {method} {url}"
+                logger.warning(msg)
+                raise ValueError(msg)
             return res
-        if res.status_code != HTTPStatus.OK:
-            msg = f"Received status_code {res.status_code} from {method} {url}"
-            logger.warning(msg)
-            raise ValueError(msg)
-        return res
+
+    def new_session(self) -> "requests.Session":
+        import requests
+        import requests.adapters
+
+        session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(
+            pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE
+        )
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        return session
+
+    def relogin(self, rejected_session: "requests.Session") -> None:
+        """Log in again, unless another thread already replaced the rejected session."""
+        with self.login_lock:
+            if self.session is rejected_session:
+                self.login()
 
     def login(self) -> None:
-        self.session = requests.Session()
+        self.session = self.new_session()
 
         # get xsrf/csrf token (is set as cookie). Works without?
         # xsrf_page_url = "https://catcoder.codingcontest.org/"
@@ -74,10 +240,10 @@ class CatCoder:
 
         # get initial SESSION cookie
         session_url = (
-            f"https://catcoder.{self.contest_domain}/oauth2/authorization/"
-            f"cc-registration?referer=https://catcoder.{self.contest_domain}/"
+            f"{self.catcoder_url}/oauth2/authorization/"
+            f"cc-registration?referer={self.catcoder_url}/"
         )
-        self.request(method="GET", url=session_url)
+        self.request(method="GET", url=session_url, relogin=False)
         first_session = self.session.cookies["SESSION"]
         logger.debug(f"Received first SESSION cookie {first_session}")
 
@@ -86,62 +252,205 @@ class CatCoder:
             "username": self.ccc_username,
             "password": self.ccc_password,
         }
-        login_url = f"https://register.{self.contest_domain}/auth/login"
-        self.request(method="POST", url=login_url, data=payload)
+        login_url = f"{self.register_url}/auth/login"
+        self.request(method="POST", url=login_url, data=payload, relogin=False)
         second_session = self.session.cookies["SESSION"]
         if first_session == second_session:
             logger.error(
                 f"Failed login for {self.ccc_username}. Check your .env file "
                 "(CCC_USERNAME + CCC_PASSWORD)"
             )
+            SESSION_CACHE_PATH.unlink(missing_ok=True)
             msg = "Login Failed"
             raise ValueError(msg)
         logger.debug(f"Received second SESSION cookie {second_session}")
+        self.save_session()
+
+    def is_rejected_session(self, res: "requests.Response") -> bool:
+        """Check if the server turned us away because our SESSION is no longer valid."""
+        if res.status_code == HTTPStatus.UNAUTHORIZED:
+            return True
+        # Expired sessions are redirected to the login page of the register domain
+        return bool(res.history) and res.url.startswith(f"{self.register_url}/")
+
+    def save_session(self) -> None:
+        """Persist the cookie jar, so following CatCoder instances can skip the login."""
+        expires_at = time.time() + SESSION_CACHE_TTL
+        cookies = []
+        for cookie in self.session.cookies:
+            if cookie.expires is not None:
+                expires_at = min(expires_at, cookie.expires)
+            cookies.append(
+                {
+                    "name": cookie.name,
+                    "value": cookie.value,
+                    "domain": cookie.domain,
+                    "path": cookie.path,
+                    "secure": cookie.secure,
+                    "expires": cookie.expires,
+                }
+            )
+        content = {
+            "username": self.ccc_username,
+            "catcoder_url": self.catcoder_url,
+            "expires_at": expires_at,
+            "cookies": cookies,
+        }
+        try:
+            SESSION_CACHE_PATH.touch(mode=0o600, exist_ok=True)
+            SESSION_CACHE_PATH.write_text(json.dumps(content), encoding="utf-8")
+        except OSError as e:
+            logger.warning(f"Could not write session cache {SESSION_CACHE_PATH}: {e}")
+
+    def load_session(self) -> bool:
+        """Restore a previously saved cookie jar, if it is still fresh.
+
+        Returns False if there is no usable cached session and a login is needed.
+        """
+        try:
+            content = json.loads(SESSION_CACHE_PATH.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return False
+        if (
+            content.get("username") != self.ccc_username
+            or content.get("catcoder_url") != self.catcoder_url
+            or content.get("expires_at", 0) <= time.time()
+        ):
+            logger.debug("Cached session is stale, ignoring it")
+            return False
+        self.session = self.new_session()
+        for cookie in content["cookies"]:
+            self.session.cookies.set(**cookie)
+        logger.debug(f"Reusing cached SESSION cookie {self.session.cookies.get('SESSION')}")
+        return True
 
     def current_level_info(self) -> LevelInfo:
-        res = self.request(
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            input_info = executor.submit(self.input_info)
+            level_state = executor.submit(self.level_state)
+            return LevelInfo.from_api(input_info.result(), level_state.result())
+
+    def input_info(self) -> dict[str, Any]:
+        return self.request(  # type: ignore[no-any-return]
             method="GET",
-            url=f"https://catcoder.{self.contest_domain}/api/game/input/info/{self.ccc_contest_id}",
+            url=f"{self.catcoder_url}/api/game/input/info/{self.ccc_contest_id}",
         ).json()
-        res2 = self.request(
+
+    def level_state(self) -> dict[str, Any]:
+        return self.request(  # type: ignore[no-any-return]
+            method="GET",
+            url=f"{self.catcoder_url}/api/game/level/{self.ccc_contest_id}",
+        ).json()
+
+    def download_level_files(self, path: Path, *, is_input_files: bool) -> list[Path]:
+        """Download the description to path, and the inputs of the level if is_input_files.
+
+        The input archive is extracted while it downloads to path / "in", including the
+        reference .out files. Returns the extracted files.
+        """
+        self.download_description(path)
+        if not is_input_files:
+            return []
+        return self.download_inputs(path / "in", path / "in")
+
+    def file_request_url(self, filetype: str) -> str:
+        res = self.request(
             method="GET",
-            url=f"https://catcoder.{self.contest_domain}/api/game/level/{self.ccc_contest_id}",
+            url=f"{self.catcoder_url}/api/contest/{self.ccc_contest_id}/file-request/{filetype}",
         ).json()
-        is_input_files = res["hasInputFile"]
-        assert len(res["tests"]) > 0
-        if res["tests"][0]["inputsDto"][0].get("name", None) is not None:
-            input_names = tuple(str(test["inputsDto"][0]["name"]) for test in res["tests"])
+        return res["url"]  # type: ignore[no-any-return]
+
+    @METRICS.span("download_description")
+    def download_description(self, path: Path) -> Path:
+        filename, chunks = self.download(self.file_request_url("description"))
+        filepath = path / filename
+        with filepath.open("wb") as fout:
+            for chunk in chunks:
+                fout.write(chunk)
+        return filepath
+
+    @METRICS.span("download_inputs")
+    def download_inputs(self, in_path: Path, out_path: Path) -> list[Path]:
+        in_path.mkdir(parents=True, exist_ok=True)
+        out_path.mkdir(parents=True, exist_ok=True)
+        _, chunks = self.download(self.file_request_url("input"))
+        unzipper = StreamingUnzipper(
+            lambda name: (out_path if name.endswith(".out") else in_path) / Path(name).name
+        )
+        for chunk in chunks:
+            unzipper.feed(chunk)
+        unzipper.close()
+        return unzipper.extracted
+
+    def download(self, url: str) -> tuple[str, Iterator[bytes]]:
+        """Start downloading url (pre-signed, no catcoder cookies needed) as a stream.
+
+        Returns the filename and an iterator over the content. Interrupted transfers are
+        resumed with range requests, and the total size is verified at the end.
+        """
+        res = self._download_response(url, offset=0)
+        if "content-disposition" in res.headers:
+            filename = re.findall(r'filename="(.+)"', res.headers["content-disposition"])[0]
         else:
-            input_names = tuple(str(idx) for idx in range(1, len(res["tests"]) + 1))
-        return LevelInfo(
-            level_nr=res["level"],
-            max_level_nr=res2["nrOfLevels"],
-            is_contest_finished=res2["gameFinished"],
-            input_names=input_names,
-            input_file_names=tuple(str(test["inputsDto"][0]["input"]) for test in res["tests"]),
-            is_input_files=is_input_files,
-            is_output_files=res["fileSolution"],
+            filename = url.split("?")[0].split("/")[-1]
+        return filename, self._download_chunks(url, res)
+
+    def _download_response(self, url: str, offset: int) -> "requests.Response":
+        import requests
+
+        headers = {"Range": f"bytes={offset}-"} if offset else {}
+        start = time.perf_counter()
+        try:
+            res = self.session.get(
+                url, headers=headers, stream=True, timeout=(HTTP_TIMEOUT[0], DOWNLOAD_TIMEOUT)
+            )
+        except requests.RequestException as e:
+            METRICS.record_request("download", "GET", start=start, error=type(e).__name__)
+            raise
+        is_ok = res.status_code in {HTTPStatus.OK, HTTPStatus.PARTIAL_CONTENT}
+        METRICS.record_request(
+            "download", "GET", start=start, error=None if is_ok else f"status {res.status_code}"
         )
+        if not is_ok:
+            msg = f"Received status_code {res.status_code} from GET {url}"
+            logger.warning(msg)
+            raise ValueError(msg)
+        if offset and res.status_code != HTTPStatus.PARTIAL_CONTENT:
+            msg = f"Server does not support resuming the download of {url}"
+            raise ValueError(msg)
+        return res
+
+    def _download_chunks(self, url: str, res: "requests.Response") -> Iterator[bytes]:
+        import requests
 
-    def download_level_files(self, path: Path, *, is_input_files: bool) -> Path | None:
-        filetypes = ["description"]
-        if is_input_files:
-            filetypes.append("input")
-        for filetype in filetypes:
-            res = self.request(
-                method="GET",
-                url=f"https://catcoder.{self.contest_domain}/api/contest/{self.ccc_contest_id}/file-request/{filetype}",
-            ).json()
-            url = res["url"]
-            res = requests.get(url, timeout=60)
-            if "content-disposition" in res.headers:
-                cd_header = res.headers["content-disposition"]
-                filepath = path / re.findall(r'filename="(.+)"', cd_header)[0]
-            else:
-                filepath = path / url.split("/")[-1]
-            with filepath.open("wb") as fout:
-                fout.write(res.content)
-        return filepath if is_input_files else None
+        expected_size = (
+            int(res.headers["content-length"])
+            if "content-length" in res.headers and "content-encoding" not in res.headers
+            else None
+        )
+        received = 0
+        for attempt in range(1, DOWNLOAD_ATTEMPTS + 1):
+            try:
+                with res:
+                    for chunk in res.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                        received += len(chunk)
+                        METRICS.add_received("download", len(chunk))
+                        yield chunk
+                break
+            except (
+                requests.ConnectionError,
+                requests.Timeout,
+                requests.exceptions.ChunkedEncodingError,
+            ) as e:
+                if attempt == DOWNLOAD_ATTEMPTS:
+                    raise
+                logger.warning(f"Download interrupted after {received} bytes ({e}), resuming")
+                METRICS.record_retry("download")
+                res = self._download_response(url, offset=received)
+        if expected_size is not None and received != expected_size:
+            msg = f"Downloaded {received} bytes from {url}, expected {expected_size}"
+            raise ValueError(msg)
+        logger.debug(f"Downloaded {received} bytes from {url}")
 
     def upload_solution(self, path: Path, stage_name: str, *, is_output_files: bool) -> bool:
         if is_output_files:
@@ -149,26 +458,38 @@ class CatCoder:
                 files = [("file", (path.parts[-1], fin, "text/plain"))]
                 res = self.request(
                     method="POST",
-                    url=f"https://catcoder.{self.contest_domain}/api/game/{self.ccc_contest_id}/upload/solution/{stage_name}",
+                    url=f"{self.catcoder_url}/api/game/{self.ccc_contest_id}/upload/solution/{stage_name}",
                     files=files,  # type: ignore[arg-type]
                 ).json()
         else:
-            with path.open(encoding="utf-8") as fin:
-                solution = next(fin).strip()  # consider only first line
-                logger.debug(f"Submitting '{solution}' for stage {stage_name}")
-                res = self.request(
-                    method="POST",
-                    url=f"https://catcoder.{self.contest_domain}/api/game/{self.ccc_contest_id}/submit",
-                    json={"results": {stage_name: solution}},
-                ).json()
+            return self.upload_solutions({path: stage_name})[stage_name]
         assert res["results"][stage_name] in {"VALID", "INVALID"}
         return res["results"][stage_name] == "VALID"  # type: ignore[no-any-return]
 
+    def upload_solutions(self, paths: dict[Path, str]) -> dict[str, bool]:
+        """Submit the text answers of several stages with a single request.
+
+        Only usable for levels without output files, paths maps answer files to stage names.
+        Returns the verdict for each stage name.
+        """
+        results = {}
+        for path, stage_name in paths.items():
+            with path.open(encoding="utf-8") as fin:
+                results[stage_name] = next(fin).strip()  # consider only first line
+        logger.debug(f"Submitting {results}")
+        res = self.request(
+            method="POST",
+            url=f"{self.catcoder_url}/api/game/{self.ccc_contest_id}/submit",
+            json={"results": results},
+        ).json()
+        assert all(res["results"][stage_name] in {"VALID", "INVALID"} for stage_name in results)
+        return {stage_name: res["results"][stage_name] == "VALID" for stage_name in results}
+
     def upload_source(self, path: Path) -> None:
         with path.open("rb") as fin:
             files = [("file", (path.parts[-1], fin, "text/plain"))]
             self.request(
                 method="POST",
-                url=f"https://catcoder.{self.contest_domain}/api/game/{self.ccc_contest_id}/1/upload",
+                url=f"{self.catcoder_url}/api/game/{self.ccc_contest_id}/1/upload",
                 files=files,  # tyape: ignore
             )
@@ -0,0 +1,74 @@
+"""Entry points which run their command in the contest daemon, if one is running.
+
+Only the standard library is imported here: a command served by the daemon does not pay
+for importing typer, git and requests. Without a daemon the command runs locally.
+"""
+
+import json
+import os
+import socket
+import sys
+from pathlib import Path
+
+DAEMON_SOCKET = Path(
+    os.getenv("CCC_DAEMON_SOCKET")
+    or Path(os.getenv("CCC_ROOT_DIR") or Path(__file__).parent).parent / ".contest_daemon.sock"
+)
+
+
+def connect() -> socket.socket | None:
+    """Return a connection to the daemon, None if no daemon is listening."""
+    if not DAEMON_SOCKET.exists():
+        return None
+    conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        conn.connect(str(DAEMON_SOCKET))
+    except OSError:  # stale socket file of a daemon which was killed
+        conn.close()
+        return None
+    return conn
+
+
+def is_daemon_running() -> bool:
+    if (conn := connect()) is None:
+        return False
+    conn.close()
+    return True
+
+
+def call(command: str, args: list[str]) -> int | None:
+    """Run command with the command line args in the daemon, forward its log to stderr.
+
+    Returns the exit code of the command, None if no daemon is running.
+    """
+    if "--help" in args or (conn := connect()) is None:
+        return None
+    with conn, conn.makefile("rwb") as stream:
+        request = {"command": command, "args": args, "color": sys.stderr.isatty()}
+        stream.write(json.dumps(request).encode() + b"\n")
+        stream.flush()
+        for line in stream:
+            message = json.loads(line)
+            if "log" in message:
+                sys.stderr.write(message["log"])
+                sys.stderr.flush()
+            else:
+                return int(message["exit_code"])
+    sys.stderr.write("Contest daemon closed the connection\n")
+    return 1
+
+
+def run_next_level() -> None:
+    if (exit_code := call("next-level", sys.argv[1:])) is not None:
+        sys.exit(exit_code)
+    from codingcontest.next_level import run
+
+    run()
+
+
+def run_submit_solutions() -> None:
+    if (exit_code := call("submit-solutions", sys.argv[1:])) is not None:
+        sys.exit(exit_code)
+    from codingcontest.submit_solutions import run
+
+    run()
@@ -0,0 +1,180 @@
+import contextlib
+import json
+import signal
+import socketserver
+import sys
+import threading
+from pathlib import Path
+from typing import TYPE_CHECKING, Any
+
+import typer
+from loguru import logger
+
+from codingcontest.catcoder import CatCoder, LevelInfo
+from codingcontest.client import DAEMON_SOCKET, is_daemon_running
+from codingcontest.judge import JudgeMode
+from codingcontest.next_level import next_level, next_level_cli
+from codingcontest.submit_solutions import submit_solutions, submit_solutions_cli
+from codingcontest.utils import ROOT_DIR, get_git_repo, latest_level_path, set_logging
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+
+LOG_FORMAT = "<green>{time:HH:mm:ss.SSS}</green> | <level>{level: <8}</level> | {message}"
+
+
+class DaemonCatCoder(CatCoder):
+    """CatCoder which caches the level info, until the level may have changed.
+
+    That is after a stage was solved, a next-level, or if the latest level directory is not
+    the one of the cached level (e.g. created by a command which did not run in the daemon).
+    """
+
+    def __post_init__(self) -> None:
+        super().__post_init__()
+        self.level_info_lock = threading.Lock()
+        self.level_info: LevelInfo | None = None
+
+    def current_level_info(self) -> LevelInfo:
+        with self.level_info_lock:
+            if self.level_info is None or latest_level_path() != (
+                ROOT_DIR / f"level{self.level_info.level_nr}"
+            ):
+                self.level_info = super().current_level_info()
+            return self.level_info
+
+    def invalidate_level_info(self) -> None:
+        with self.level_info_lock:
+            self.level_info = None
+
+    def upload_solution(self, path: Path, stage_name: str, *, is_output_files: bool) -> bool:
+        is_valid = super().upload_solution(path, stage_name, is_output_files=is_output_files)
+        if is_valid:
+            self.invalidate_level_info()
+        return is_valid
+
+    def upload_solutions(self, paths: dict[Path, str]) -> dict[str, bool]:
+        verdicts = super().upload_solutions(paths)
+        if any(verdicts.values()):
+            self.invalidate_level_info()
+        return verdicts
+
+
+class ContestDaemon(socketserver.ThreadingUnixStreamServer):
+    """Serves the commands of codingcontest.client, one at a time.
+
+    Holds the logged in session, the git repo and the level info between commands.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, socket_path: Path, catcoder: DaemonCatCoder) -> None:
+        """Listen on socket_path, commands use catcoder."""
+        super().__init__(str(socket_path), DaemonHandler)
+        self.command_lock = threading.Lock()
+        self.catcoder = catcoder
+        self.commands: dict[str, tuple[Callable[..., None], Callable[..., None]]] = {
+            "next-level": (next_level_cli, self.next_level),
+            "submit-solutions": (submit_solutions_cli, self.submit_solutions),
+        }
+
+    def warm_up(self) -> None:
+        """Do the work of the first command up front."""
+        get_git_repo(dirty_check=False)
+        self.catcoder.current_level_info()
+
+    def next_level(self) -> None:
+        try:
+            next_level(catcoder=self.catcoder)
+        finally:
+            self.catcoder.invalidate_level_info()
+
+    def submit_solutions(self, *, judge: str, **kwargs: Any) -> None:  # noqa: ANN401
+        submit_solutions(catcoder=self.catcoder, judge=JudgeMode(judge), **kwargs)
+
+    def run_command(self, command: str, args: list[str]) -> int:
+        """Run command with the command line args, return its exit code."""
+        if command not in self.commands:
+            logger.error(f"Unknown command {command}")
+            return 1
+        cli, function = self.commands[command]
+        app = typer.Typer(add_completion=False)
+        app.command()(cli)
+        try:
+            with typer.main.get_command(app).make_context(command, args) as ctx:
+                kwargs = dict(ctx.params)
+        except Exception as e:  # noqa: BLE001, the click exception types vary with typer versions
+            logger.error(f"{command}: {e}")
+            return getattr(e, "exit_code", 2)
+        kwargs.pop("verbose")
+        try:
+            function(**kwargs)
+        except typer.Exit as e:
+            return e.exit_code
+        except Exception:
+            logger.exception(f"{command} failed")
+            return 1
+        return 0
+
+
+class DaemonHandler(socketserver.StreamRequestHandler):
+    server: ContestDaemon
+
+    def handle(self) -> None:
+        if not (line := self.rfile.readline()):
+            return  # only checked if the daemon is running
+        request = json.loads(line)
+        verbose = "-v" in request["args"] or "--verbose" in request["args"]
+        with self.server.command_lock:
+            sink_id = logger.add(
+                self.forward_log,
+                level="DEBUG" if verbose else "INFO",
+                format=LOG_FORMAT,
+                colorize=request["color"],
+            )
+            try:
+                exit_code = self.server.run_command(request["command"], request["args"])
+            finally:
+                logger.remove(sink_id)
+        self.send({"exit_code": exit_code})
+
+    def forward_log(self, message: str) -> None:
+        with contextlib.suppress(OSError):  # client went away, the command still runs to the end
+            self.send({"log": str(message)})
+
+    def send(self, message: dict[str, Any]) -> None:
+        self.wfile.write(json.dumps(message).encode() + b"\n")
+        self.wfile.flush()
+
+
+def contest_daemon_cli(
+    verbose: bool = typer.Option(False, "--verbose", "-v"),  # noqa: B008, FBT001, FBT003
+) -> None:
+    """Keep a catcoder session, the git repo and the level info ready for commands.
+
+    next-level and submit-solutions are run by this daemon while it is running.
+    """
+    set_logging(verbose=verbose)
+    if is_daemon_running():
+        logger.error(f"A contest daemon is already listening on {DAEMON_SOCKET}")
+        raise typer.Exit(code=1)
+    catcoder = DaemonCatCoder()
+    DAEMON_SOCKET.unlink(missing_ok=True)
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    with ContestDaemon(DAEMON_SOCKET, catcoder=catcoder) as daemon:
+        try:
+            daemon.warm_up()
+            logger.info(f"Contest daemon for {ROOT_DIR} listening on {DAEMON_SOCKET}")
+            daemon.serve_forever()
+        except KeyboardInterrupt:
+            logger.info("Contest daemon stopped")
+        finally:
+            DAEMON_SOCKET.unlink(missing_ok=True)
+
+
+def run() -> None:
+    typer.run(contest_daemon_cli)
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,452 @@
+import cProfile
+import functools
+import importlib.util
+import json
+import math
+import multiprocessing
+import os
+import queue
+import signal
+import sys
+import threading
+import time
+import traceback
+import tracemalloc
+from collections import defaultdict
+from collections.abc import Callable, Iterable, Iterator, MutableMapping
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from types import FrameType, ModuleType
+from typing import Protocol
+
+from loguru import logger
+from tqdm import tqdm
+
+REPORT_DIRNAME = ".harness"  # in the level directory
+SOLVER_FILENAME = "solve.py"  # in the level directory, with a solve_file function
+PROFILE_TOP_FUNCTIONS = 10
+ANYTIME_OVERRUN = 10.0  # seconds a candidate search may take beyond its budget, then killed
+
+
+@dataclass
+class InputProfile:
+    """What happened while solving one input, in a worker process."""
+
+    stem: str
+    status: str = "running"  # solved, unsolved, timeout or error
+    wall: float = 0.0  # seconds
+    phases: dict[str, float] = field(default_factory=lambda: defaultdict(float))
+    interrupted_phase: str | None = None  # innermost phase running on timeout or error
+    peak_rss_mb: float = 0.0  # of the worker process so far, it solves several inputs
+    peak_traced_mb: float | None = None  # of this input, if memory was traced
+    profile_path: str | None = None
+    top_functions: list[str] = field(default_factory=list)
+    error: str | None = None
+
+
+_CURRENT_PROFILE: ContextVar[InputProfile | None] = ContextVar("current_profile", default=None)
+
+
+@contextmanager
+def phase(name: str) -> Iterator[None]:
+    """Measure the wall time of a part of solving an input, e.g. "parse" or "solve".
+
+    The times are added up per name and end up in the harness report. Outside of
+    solve_in_parallel the time is only logged with debug level.
+    """
+    input_profile = _CURRENT_PROFILE.get()
+    start = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        if input_profile is not None and input_profile.interrupted_phase is None:
+            input_profile.interrupted_phase = name
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        if input_profile is not None:
+            input_profile.phases[name] += elapsed
+        else:
+            logger.debug(f"{name} took {elapsed:.3f}s")
+
+
+def solve_in_parallel(
+    solve_file: Callable[[str], bool],
+    input_files: Iterable[str],
+    *,
+    on_solved: Callable[[Path], bool] | None = None,
+    timeout: float | None = None,
+    max_workers: int | None = None,
+    profile: bool = False,
+    trace_memory: bool = False,
+) -> dict[str, bool]:
+    """Run solve_file for all input_files in a process pool.
+
+    solve_file has to be a module level function (it is pickled to the worker processes)
+    and returns True if an output file was written. on_solved is called in this process
+    for each successfully solved input as soon as it is done, e.g. to submit it. If it
+    returns False, inputs which did not start solving yet are cancelled.
+    timeout is the wall-clock limit in seconds for each input (only on POSIX systems).
+
+    For each input the wall time of its phases (see phase), the peak memory and with
+    profile a cProfile of the input are recorded. They are written to .harness/report.json
+    of the level directory, and summarized in a table at the end.
+    Returns for each input file stem if it was solved.
+    """
+    input_paths = [Path(inputfile) for inputfile in input_files]
+    if not input_paths:
+        return {}
+    report_path = input_paths[0].parent.parent / REPORT_DIRNAME
+    report_path.mkdir(exist_ok=True)
+    results: dict[str, bool] = {}
+    profiles: list[InputProfile] = []
+    with ProcessPoolExecutor(max_workers=max_workers) as executor, tqdm(
+        total=len(input_paths), desc="Solving", unit="input"
+    ) as progress:
+        futures = {
+            executor.submit(
+                _solve_with_profile,
+                solve_file,
+                str(inputfile),
+                timeout=timeout,
+                profile_path=report_path / f"{inputfile.stem}.prof" if profile else None,
+                trace_memory=trace_memory,
+            ): inputfile
+            for inputfile in input_paths
+        }
+        for future in as_completed(futures):
+            inputfile = futures[future]
+            try:
+                input_profile = future.result()
+            except Exception:  # e.g. the worker process died
+                logger.exception(f"Solving {inputfile.stem} failed")
+                input_profile = InputProfile(stem=inputfile.stem, status="error")
+            profiles.append(input_profile)
+            if input_profile.status == "timeout":
+                logger.warning(
+                    f"Solving {inputfile.stem} took longer than {timeout}s ⏰ "
+                    f"(in phase {input_profile.interrupted_phase})"
+                )
+            elif input_profile.status == "error":
+                logger.error(f"Solving {inputfile.stem} failed\n{input_profile.error}")
+            results[inputfile.stem] = input_profile.status == "solved"
+            progress.set_postfix_str(inputfile.stem)
+            progress.update()
+            if results[inputfile.stem] and on_solved is not None and not on_solved(inputfile):
+                executor.shutdown(wait=False, cancel_futures=True)
+                break
+    write_report(report_path / "report.json", profiles)
+    logger.info(f"Solved inputs, slowest first:\n{summary_table(profiles)}")
+    return results
+
+
+class Candidate(Protocol):
+    """A solution of an input, e.g. the Output of the template."""
+
+    def write_file(self, output_stem: str) -> None: ...
+
+
+def solve_anytime(
+    solve_candidates: Callable[[str], Iterable[tuple[float, Candidate]]],
+    input_files: Iterable[str],
+    *,
+    budget: float,
+    on_checkpoint: Callable[[Path], bool] | None = None,
+    submit_interval: float = 30.0,
+    minimize: bool = False,
+    max_workers: int | None = None,
+    profile: bool = False,
+    trace_memory: bool = False,
+) -> dict[str, bool]:
+    """Run solve_candidates for all input_files in a process pool, keeping the best candidate.
+
+    solve_candidates (a module level function) yields (score, candidate) whenever it finds
+    a solution, the search gets budget seconds per input. Each candidate with a better
+    score (higher, or lower with minimize) is written to out/ right away, so the best
+    one survives the end of the budget. on_checkpoint is called in this process for the
+    newest checkpoint of an input, at most once every submit_interval seconds over all
+    inputs. If it returns True (e.g. the checkpoint was VALID), the search of that input
+    stops. Returns for each input file stem if a candidate was written.
+
+    While on_checkpoint runs, no output in out/ is replaced (better candidates are written
+    after it), so the file it submits and hashes is the one left in out/. The output of
+    an accepted input is never replaced.
+    """
+    with multiprocessing.Manager() as manager:
+        checkpoints = manager.Queue()  # (input file, score) of each new best, None at the end
+        accepted = manager.dict()  # input stems whose checkpoint on_checkpoint accepted
+        output_lock = manager.Lock()  # held while writing or submitting an output
+        submitter = threading.Thread(
+            target=_submit_checkpoints,
+            args=(checkpoints, accepted, output_lock, on_checkpoint, submit_interval),
+            name="checkpoint-submitter",
+        )
+        submitter.start()
+        try:
+            return solve_in_parallel(
+                functools.partial(
+                    _solve_candidates,
+                    solve_candidates,
+                    checkpoints,
+                    accepted,
+                    output_lock,
+                    budget=budget,
+                    minimize=minimize,
+                ),
+                input_files,
+                timeout=budget + ANYTIME_OVERRUN,
+                max_workers=max_workers,
+                profile=profile,
+                trace_memory=trace_memory,
+            )
+        finally:
+            checkpoints.put(None)
+            submitter.join()
+
+
+def _solve_candidates(
+    solve_candidates: Callable[[str], Iterable[tuple[float, Candidate]]],
+    checkpoints: "queue.Queue[tuple[str, float] | None]",
+    accepted: MutableMapping[str, bool],
+    output_lock: "threading.Lock",
+    inputfile: str,
+    *,
+    budget: float,
+    minimize: bool,
+) -> bool:
+    deadline = time.monotonic() + budget
+    stem = Path(inputfile).stem
+    best_score: float | None = None
+    unwritten: tuple[float, Candidate] | None = None  # better than the output in out/
+    is_written = False
+
+    def write_unwritten(*, block: bool) -> None:
+        nonlocal unwritten, is_written
+        if unwritten is None or not output_lock.acquire(blocking=block):
+            return  # without block, an output is being submitted: write it later
+        try:
+            if stem not in accepted:
+                score, candidate = unwritten
+                with phase("checkpoint"):
+                    candidate.write_file(stem)
+                checkpoints.put((inputfile, score))
+                is_written = True
+        finally:
+            output_lock.release()
+        unwritten = None
+
+    try:
+        for score, candidate in solve_candidates(inputfile):
+            if stem in accepted:
+                break
+            if best_score is None or (score < best_score if minimize else score > best_score):
+                best_score = score
+                unwritten = (score, candidate)
+            write_unwritten(block=False)
+            if time.monotonic() >= deadline:
+                break
+    except TimeoutError:
+        pass  # no candidate within the overrun, the last checkpoint stays
+    write_unwritten(block=True)
+    return is_written
+
+
+def _submit_checkpoints(
+    checkpoints: "queue.Queue[tuple[str, float] | None]",
+    accepted: MutableMapping[str, bool],
+    output_lock: "threading.Lock",
+    on_checkpoint: Callable[[Path], bool] | None,
+    submit_interval: float,
+) -> None:
+    """Pass the newest checkpoint of each input to on_checkpoint, rate limited."""
+    pending: dict[str, Path] = {}  # input stem -> input file, oldest first
+    last_submit = -math.inf
+    is_done = False
+    while not is_done or pending:
+        wait = max(0.0, last_submit + submit_interval - time.monotonic())
+        if is_done:
+            time.sleep(wait)
+        else:
+            try:
+                checkpoint = checkpoints.get(timeout=wait if pending else None)
+            except queue.Empty:
+                pass
+            else:
+                if checkpoint is None:
+                    is_done = True
+                else:
+                    input_path = Path(checkpoint[0])
+                    logger.debug(f"{input_path.stem}: new best score {checkpoint[1]}")
+                    if on_checkpoint is not None and input_path.stem not in accepted:
+                        pending.setdefault(input_path.stem, input_path)
+        if pending and time.monotonic() >= last_submit + submit_interval:
+            assert on_checkpoint is not None
+            last_submit = time.monotonic()
+            with output_lock:  # the output cannot change between hashing and uploading it
+                _submit_checkpoint(pending.pop(next(iter(pending))), accepted, on_checkpoint)
+
+
+def _submit_checkpoint(
+    input_path: Path, accepted: MutableMapping[str, bool], on_checkpoint: Callable[[Path], bool]
+) -> None:
+    try:
+        is_accepted = on_checkpoint(input_path)
+    except Exception:
+        logger.exception(f"Submitting the checkpoint of {input_path.stem} failed")
+        return
+    if is_accepted:
+        logger.info(f"{input_path.stem} accepted, stopping its search")
+        accepted[input_path.stem] = True
+
+
+def _raise_timeout(signum: int, frame: FrameType | None) -> None:  # noqa: ARG001
+    raise TimeoutError
+
+
+def _solve_with_profile(
+    solve_file: Callable[[str], bool],
+    inputfile: str,
+    *,
+    timeout: float | None,
+    profile_path: Path | None,
+    trace_memory: bool,
+) -> InputProfile:
+    """Solve inputfile in a worker process, with a timeout and the measurements."""
+    input_profile = InputProfile(stem=Path(inputfile).stem)
+    current_profile_token = _CURRENT_PROFILE.set(input_profile)
+    profiler = cProfile.Profile() if profile_path is not None else None
+    if trace_memory:
+        tracemalloc.start()
+    if not hasattr(signal, "setitimer"):
+        timeout = None
+    if timeout is not None:
+        signal.signal(signal.SIGALRM, _raise_timeout)
+        signal.setitimer(signal.ITIMER_REAL, timeout)
+    start = time.perf_counter()
+    try:
+        if profiler is not None:
+            profiler.enable()
+        input_profile.status = "solved" if solve_file(inputfile) else "unsolved"
+    except TimeoutError:
+        input_profile.status = "timeout"
+    except Exception:  # noqa: BLE001
+        input_profile.status = "error"
+        input_profile.error = traceback.format_exc()
+    finally:
+        if timeout is not None:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+        if profiler is not None:
+            profiler.disable()
+        input_profile.wall = time.perf_counter() - start
+        _CURRENT_PROFILE.reset(current_profile_token)
+    _add_measurements(input_profile, profiler, profile_path, trace_memory=trace_memory)
+    return input_profile
+
+
+def _add_measurements(
+    input_profile: InputProfile,
+    profiler: cProfile.Profile | None,
+    profile_path: Path | None,
+    *,
+    trace_memory: bool,
+) -> None:
+    """Add the memory and profile of the solved input to input_profile, in the worker."""
+    if trace_memory:
+        input_profile.peak_traced_mb = tracemalloc.get_traced_memory()[1] / 1024**2
+        tracemalloc.stop()
+    input_profile.peak_rss_mb = peak_rss_mb()
+    if profiler is not None and profile_path is not None:
+        profiler.dump_stats(profile_path)
+        input_profile.profile_path = str(profile_path)
+        input_profile.top_functions = top_functions(profiler)
+    input_profile.phases = dict(input_profile.phases)
+
+
+def peak_rss_mb() -> float:
+    if sys.platform == "win32":
+        return 0.0
+    import resource
+
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return max_rss / 1024**2 if sys.platform == "darwin" else max_rss / 1024  # bytes vs KiB
+
+
+def top_functions(profiler: cProfile.Profile) -> list[str]:
+    """Return the functions with the highest cumulative time, with their number of calls."""
+    import pstats  # only needed with profile=True
+
+    stats = pstats.Stats(profiler)
+    entries = sorted(
+        stats.stats.items(),  # type: ignore[attr-defined]
+        key=lambda entry: entry[1][3],  # cumulative time
+        reverse=True,
+    )
+    return [
+        f"{cumulative:8.3f}s {calls:>8} {Path(filename).name}:{lineno}({function_name})"
+        for (filename, lineno, function_name), (_, calls, _, cumulative, _) in entries[
+            :PROFILE_TOP_FUNCTIONS
+        ]
+    ]
+
+
+def write_report(path: Path, profiles: list[InputProfile]) -> None:
+    """Update the report of the level, the entries of other inputs are kept."""
+    inputs = {}
+    if path.exists():
+        try:
+            inputs = {entry["stem"]: entry for entry in json.loads(path.read_text())["inputs"]}
+        except (ValueError, KeyError) as e:
+            logger.warning(f"Replacing broken harness report {path}: {e}")
+    inputs.update({input_profile.stem: asdict(input_profile) for input_profile in profiles})
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    tmp_path.write_text(
+        json.dumps({"inputs": sorted(inputs.values(), key=lambda entry: entry["stem"])}, indent=1)
+    )
+    tmp_path.replace(path)
+
+
+def summary_table(profiles: list[InputProfile]) -> str:
+    phase_names = sorted({name for input_profile in profiles for name in input_profile.phases})
+    header = ["input", "status", "wall", *phase_names, "peak MB", "slow in"]
+    rows = [header]
+    for input_profile in sorted(profiles, key=lambda input_profile: -input_profile.wall):
+        peak_mb = (
+            input_profile.peak_rss_mb
+            if input_profile.peak_traced_mb is None
+            else input_profile.peak_traced_mb
+        )
+        rows.append(
+            [
+                input_profile.stem,
+                input_profile.status,
+                f"{input_profile.wall:.3f}s",
+                *(f"{input_profile.phases.get(name, 0.0):.3f}s" for name in phase_names),
+                f"{peak_mb:.0f}",
+                input_profile.interrupted_phase or "",
+            ]
+        )
+    widths = [max(len(row[idx]) for row in rows) for idx in range(len(header))]
+    return "\n".join(
+        "  ".join(cell.ljust(width) for cell, width in zip(row, widths, strict=True))
+        for row in rows
+    )
+
+
+def solve_with_level_solver(solver_path: str, inputfile: str) -> bool:
+    """Run solve_file of the solver of a level, in a worker process."""
+    return bool(load_level_solver(solver_path).solve_file(inputfile))
+
+
+@functools.cache
+def load_level_solver(solver_path: str) -> ModuleType:
+    """Import the solver once per worker process, every solve_in_parallel has a new pool."""
+    sys.path.insert(0, str(Path(solver_path).parent))  # for imports next to the solver
+    spec = importlib.util.spec_from_file_location("level_solver", solver_path)
+    assert spec is not None
+    assert spec.loader is not None
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
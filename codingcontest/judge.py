@@ -0,0 +1,100 @@
+import difflib
+import math
+from enum import Enum
+from pathlib import Path
+
+from loguru import logger
+
+DIFF_CONTEXT_LINES = 3
+
+
+class JudgeMode(str, Enum):
+    EXACT = "exact"
+    WHITESPACE = "whitespace"  # ignore amount and kind of whitespace (incl. line endings)
+    FLOAT = "float"  # like whitespace, numbers may differ by the float tolerance
+    OFF = "off"
+
+
+def judge_outputs(
+    level_path: Path, filestems: set[str] | None, *, mode: JudgeMode, tolerance: float
+) -> dict[str, bool]:
+    """Compare out/ files of level_path with the reference .out files shipped in in/.
+
+    Only considers filestems if set, and only stages which have both files. Logs a diff
+    for each mismatch. Returns if the output matched, by filestem.
+    """
+    results: dict[str, bool] = {}
+    if mode == JudgeMode.OFF:
+        return results
+    for reference_path in sorted((level_path / "in").glob("*.out")):
+        output_path = level_path / "out" / reference_path.name
+        if (filestems is not None and reference_path.stem not in filestems) or (
+            not output_path.exists()
+        ):
+            continue
+        actual = output_path.read_text(encoding="utf-8")
+        expected = reference_path.read_text(encoding="utf-8")
+        results[reference_path.stem] = outputs_match(
+            actual, expected, mode=mode, tolerance=tolerance
+        )
+        if results[reference_path.stem]:
+            logger.info(f"{reference_path.stem} matches the reference output locally ✅")
+        else:
+            difference = first_difference(actual, expected, name=reference_path.name)
+            logger.info(
+                f"{reference_path.stem} differs from the reference output ❌\n{difference}"
+            )
+    return results
+
+
+def outputs_match(actual: str, expected: str, *, mode: JudgeMode, tolerance: float) -> bool:
+    if mode == JudgeMode.EXACT:
+        return actual == expected
+    actual_tokens, expected_tokens = actual.split(), expected.split()
+    if mode == JudgeMode.WHITESPACE or len(actual_tokens) != len(expected_tokens):
+        return actual_tokens == expected_tokens
+    return all(
+        tokens_match(actual_token, expected_token, tolerance=tolerance)
+        for actual_token, expected_token in zip(actual_tokens, expected_tokens, strict=True)
+    )
+
+
+def tokens_match(actual: str, expected: str, *, tolerance: float) -> bool:
+    """Compare as floats if both are numbers (also inside comma separated lists)."""
+    if actual == expected:
+        return True
+    actual_parts, expected_parts = actual.split(","), expected.split(",")
+    if len(actual_parts) != len(expected_parts):
+        return False
+    try:
+        return all(
+            math.isclose(float(a), float(e), rel_tol=tolerance, abs_tol=tolerance)
+            for a, e in zip(actual_parts, expected_parts, strict=True)
+        )
+    except ValueError:
+        return False
+
+
+def first_difference(actual: str, expected: str, *, name: str) -> str:
+    """Unified diff around the first differing line, cheap even for huge outputs."""
+    actual_lines, expected_lines = actual.splitlines(), expected.splitlines()
+    first = next(
+        (
+            idx
+            for idx, (a, e) in enumerate(zip(actual_lines, expected_lines, strict=False))
+            if a.split() != e.split()
+        ),
+        min(len(actual_lines), len(expected_lines)),
+    )
+    start = max(0, first - DIFF_CONTEXT_LINES)
+    end = first + DIFF_CONTEXT_LINES + 1
+    return "\n".join(
+        line[:200]
+        for line in difflib.unified_diff(
+            expected_lines[start:end],
+            actual_lines[start:end],
+            fromfile=f"in/{name} (reference)",
+            tofile=f"out/{name}",
+            lineterm="",
+        )
+    )
@@ -0,0 +1,57 @@
+import hashlib
+import json
+import os
+from pathlib import Path
+
+from loguru import logger
+
+LEDGER_FILENAME = ".submission_ledger.json"
+LEGACY_SUCCESS_FILENAME = ".successfully_submitted"
+
+
+class SubmissionLedger:
+    """Verdicts of catcoder per stage and sha256 of the submitted output file.
+
+    Stored as json in the out/ folder of a level. Stages listed in the older
+    .successfully_submitted file are treated as VALID with an unknown hash.
+    """
+
+    def __init__(self, output_files_path: Path) -> None:
+        """Load the ledger of the level whose outputs are in output_files_path."""
+        self.path = output_files_path / LEDGER_FILENAME
+        self.verdicts: dict[str, dict[str, bool]] = {}  # filestem -> sha256 -> is_valid
+        if self.path.exists():
+            try:
+                self.verdicts = json.loads(self.path.read_text(encoding="utf-8"))
+            except ValueError as e:
+                logger.warning(f"Ignoring broken submission ledger {self.path}: {e}")
+        legacy_path = output_files_path / LEGACY_SUCCESS_FILENAME
+        if legacy_path.exists():
+            for line in legacy_path.read_text(encoding="utf-8").splitlines():
+                if line.strip():
+                    self.verdicts.setdefault(line.strip(), {}).setdefault("", True)
+
+    @staticmethod
+    def digest(path: Path) -> str:
+        sha256 = hashlib.sha256()
+        with path.open("rb") as fin:
+            while chunk := fin.read(1024 * 1024):
+                sha256.update(chunk)
+        return sha256.hexdigest()
+
+    def lookup(self, filestem: str, digest: str) -> bool | None:
+        """Verdict for exactly this output of the stage, None if it was never submitted."""
+        return self.verdicts.get(filestem, {}).get(digest)
+
+    def record(self, filestem: str, digest: str, *, is_valid: bool) -> None:
+        self.verdicts.setdefault(filestem, {})[digest] = is_valid
+
+    def successful_stages(self) -> set[str]:
+        return {
+            filestem for filestem, by_digest in self.verdicts.items() if any(by_digest.values())
+        }
+
+    def save(self) -> None:
+        tmp_path = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+        tmp_path.write_text(json.dumps(self.verdicts, indent=1, sort_keys=True), encoding="utf-8")
+        tmp_path.replace(self.path)
@@ -0,0 +1,171 @@
+import contextlib
+import dataclasses
+import functools
+import hashlib
+import inspect
+import os
+import pickle
+import threading
+from collections.abc import Callable
+from pathlib import Path
+from typing import Any, ParamSpec, TypeVar
+
+import numpy as np
+from loguru import logger
+
+from codingcontest.utils import ROOT_DIR
+
+MEMO_CACHE_DIR = Path(os.getenv("CCC_MEMO_CACHE_DIR") or ROOT_DIR / ".memo_cache")
+MEMO_CACHE_MAX_BYTES = int(os.getenv("CCC_MEMO_CACHE_MAX_BYTES", str(2 * 1024**3)))
+
+P = ParamSpec("P")
+R = TypeVar("R")
+
+
+def memoize(func: Callable[P, R]) -> Callable[P, R]:
+    """Cache the results of func on disk, shared by all levels and worker processes.
+
+    The key is the source code of func plus a fingerprint of the arguments (numpy arrays
+    by content), so a copy of the function in the next level finds the results of the
+    previous level. Only the source of func itself is hashed: if a helper it calls
+    changes, clear the cache (delete codingcontest/.memo_cache). Results must be picklable.
+    """
+    function_key = function_digest(func)
+
+    @functools.wraps(func)
+    def wrapper(*args: P.args, **kwargs: P.kwargs) -> R:
+        key = fingerprint((function_key, args, kwargs))
+        is_hit, cached = MEMO_CACHE.get(key)
+        if is_hit:
+            logger.debug(f"Memo cache hit for {func.__qualname__}")
+            return cached  # type: ignore[no-any-return]
+        result = func(*args, **kwargs)
+        MEMO_CACHE.put(key, result)
+        return result
+
+    return wrapper
+
+
+def function_digest(func: Callable[..., Any]) -> str:
+    try:
+        source = inspect.getsource(func)
+    except (OSError, TypeError):  # e.g. defined in an interactive session
+        source = repr(func.__code__.co_code) + repr(func.__code__.co_consts)
+    return f"{func.__qualname__}:{hashlib.sha256(source.encode()).hexdigest()}"
+
+
+def fingerprint(value: Any) -> str:  # noqa: ANN401
+    sha256 = hashlib.sha256()
+    _update_fingerprint(sha256, value)
+    return sha256.hexdigest()
+
+
+def _update_fingerprint(  # noqa: C901
+    sha256: "hashlib._Hash", value: Any  # noqa: ANN401, SLF001
+) -> None:
+    sha256.update(type(value).__qualname__.encode() + b"\0")
+    if isinstance(value, np.ndarray):
+        sha256.update(f"{value.dtype.str}{value.shape}".encode())
+        if value.dtype.hasobject:
+            _update_fingerprint(sha256, value.tolist())
+        else:
+            sha256.update(np.ascontiguousarray(value).data)
+    elif isinstance(value, str | bytes | int | float | complex | bool | Path | np.generic) or (
+        value is None
+    ):
+        sha256.update(repr(value).encode())
+    elif isinstance(value, list | tuple):
+        sha256.update(f"{len(value)}".encode())
+        for item in value:
+            _update_fingerprint(sha256, item)
+    elif isinstance(value, dict):
+        sha256.update(f"{len(value)}".encode())
+        for item_key, item in sorted(value.items(), key=lambda item: fingerprint(item[0])):
+            _update_fingerprint(sha256, item_key)
+            _update_fingerprint(sha256, item)
+    elif isinstance(value, set | frozenset):
+        sha256.update("".join(sorted(fingerprint(item) for item in value)).encode())
+    elif dataclasses.is_dataclass(value) and not isinstance(value, type):
+        for field in dataclasses.fields(value):
+            sha256.update(field.name.encode())
+            _update_fingerprint(sha256, getattr(value, field.name))
+    else:
+        sha256.update(pickle.dumps(value))
+    sha256.update(b"\1")
+
+
+class DiskCache:
+    """Pickled values by key in a directory, least recently used entries are evicted.
+
+    Writes go to a temporary file which is renamed into place, so concurrent processes
+    never see a partial entry. Reading an entry updates its mtime, the LRU order. The
+    size on disk is checked with the first write of each process (most write little)
+    and after every max_bytes / 8 written by it.
+    """
+
+    def __init__(self, path: Path, max_bytes: int) -> None:
+        """Cache in path, evicting entries once it is larger than max_bytes."""
+        self.path = path
+        self.max_bytes = max_bytes
+        self.written_bytes = 0  # since the last eviction check
+        self.checked_pid: int | None = None  # process which checked the size, forks inherit
+        self.lock = threading.Lock()
+
+    def entry_path(self, key: str) -> Path:
+        return self.path / key[:2] / f"{key}.pkl"
+
+    def get(self, key: str) -> tuple[bool, Any]:
+        entry_path = self.entry_path(key)
+        try:
+            with entry_path.open("rb") as fin:
+                result = pickle.load(fin)  # noqa: S301, only our own cache files
+        except FileNotFoundError:  # also if evicted by another process just now
+            return False, None
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError) as e:
+            logger.warning(f"Ignoring broken memo cache entry {entry_path}: {e}")
+            return False, None
+        with contextlib.suppress(OSError):
+            os.utime(entry_path)
+        return True, result
+
+    def put(self, key: str, value: Any) -> None:  # noqa: ANN401
+        if self.max_bytes <= 0:
+            return
+        entry_path = self.entry_path(key)
+        entry_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = entry_path.with_name(f".{key}.{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            with tmp_path.open("wb") as fout:
+                pickle.dump(value, fout, protocol=pickle.HIGHEST_PROTOCOL)
+                size = fout.tell()
+        except (pickle.PicklingError, TypeError, AttributeError) as e:
+            logger.warning(f"Cannot store {type(value).__qualname__} in the memo cache: {e}")
+            tmp_path.unlink(missing_ok=True)
+            return
+        tmp_path.replace(entry_path)
+        with self.lock:
+            self.written_bytes += size
+            if self.written_bytes * 8 < self.max_bytes and self.checked_pid == os.getpid():
+                return
+            self.written_bytes = 0
+            self.checked_pid = os.getpid()
+        self.evict()
+
+    def evict(self) -> None:
+        """Delete the least recently used entries until the cache fits into max_bytes."""
+        entries = []
+        for entry_path in self.path.glob("*/*.pkl"):
+            try:
+                stat = entry_path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry_path))
+        total_bytes = sum(size for _, size, _ in entries)
+        for _, size, entry_path in sorted(entries):
+            if total_bytes <= self.max_bytes:
+                break
+            entry_path.unlink(missing_ok=True)
+            total_bytes -= size
+
+
+MEMO_CACHE = DiskCache(MEMO_CACHE_DIR, max_bytes=MEMO_CACHE_MAX_BYTES)
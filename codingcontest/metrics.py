@@ -0,0 +1,198 @@
+import atexit
+import bisect
+import contextlib
+import json
+import os
+import re
+import statistics
+import sys
+import threading
+import time
+from collections.abc import Iterator
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any
+
+from loguru import logger
+
+METRICS_REPORT_PATH = os.getenv("CCC_METRICS_REPORT")  # json report written at exit
+METRICS_TRACE_PATH = os.getenv("CCC_METRICS_TRACE")  # chrome://tracing file written at exit
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)  # seconds
+ENDPOINT_PATTERNS = (  # first match wins, urls of none of them are "other"
+    ("login", re.compile(r"/oauth2/authorization/|/auth/login")),
+    ("info", re.compile(r"/api/game/input/info/")),
+    ("level", re.compile(r"/api/game/level/")),
+    ("file-request", re.compile(r"/file-request/")),
+    ("upload", re.compile(r"/upload")),
+    ("submit", re.compile(r"/submit$")),
+)
+
+
+def endpoint_of(url: str) -> str:
+    """Class of a catcoder url, for grouping the request metrics."""
+    path = url.split("?")[0]
+    return next((name for name, pattern in ENDPOINT_PATTERNS if pattern.search(path)), "other")
+
+
+@dataclass
+class EndpointMetrics:
+    count: int = 0
+    errors: int = 0
+    retries: int = 0
+    bytes_sent: int = 0
+    bytes_received: int = 0
+    latencies: list[float] = field(default_factory=list)  # seconds, downloads: until headers
+
+    def summary(self) -> dict[str, Any]:
+        histogram = [0] * (len(LATENCY_BUCKETS) + 1)
+        for latency in self.latencies:
+            histogram[bisect.bisect_left(LATENCY_BUCKETS, latency)] += 1
+        labels = [f"<={bucket}s" for bucket in LATENCY_BUCKETS] + [f">{LATENCY_BUCKETS[-1]}s"]
+        latencies = sorted(self.latencies)
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "retries": self.retries,
+            "bytes_sent": self.bytes_sent,
+            "bytes_received": self.bytes_received,
+            "latency": {
+                "total": sum(latencies),
+                "mean": statistics.fmean(latencies) if latencies else None,
+                "p50": _percentile(latencies, 0.5),
+                "p95": _percentile(latencies, 0.95),
+                "max": latencies[-1] if latencies else None,
+                "histogram": dict(zip(labels, histogram, strict=True)),
+            },
+        }
+
+
+def _percentile(values: list[float], fraction: float) -> float | None:
+    return values[min(len(values) - 1, int(len(values) * fraction))] if values else None
+
+
+class Metrics:
+    """Request metrics per endpoint and timed phases, of this process.
+
+    Counters are always collected (a few per request). Trace events are only kept if
+    is_tracing, for the Chrome trace (load it in chrome://tracing or ui.perfetto.dev).
+    """
+
+    def __init__(self, *, is_tracing: bool) -> None:
+        """Start the clock of the trace, events are only kept if is_tracing."""
+        self.is_tracing = is_tracing
+        self.start = time.perf_counter()
+        self.lock = threading.Lock()
+        self.endpoints: dict[str, EndpointMetrics] = {}
+        self.phases: dict[str, list[float]] = {}
+        self.events: list[dict[str, Any]] = []
+        self.thread_names: dict[int, str] = {}
+
+    def record_request(
+        self,
+        endpoint: str,
+        method: str,
+        *,
+        start: float,
+        sent: int = 0,
+        received: int = 0,
+        error: str | None = None,
+    ) -> None:
+        """Record one attempt of a request, start is its time.perf_counter()."""
+        latency = time.perf_counter() - start
+        with self.lock:
+            metrics = self.endpoints.setdefault(endpoint, EndpointMetrics())
+            metrics.count += 1
+            metrics.errors += error is not None
+            metrics.bytes_sent += sent
+            metrics.bytes_received += received
+            metrics.latencies.append(latency)
+            self._add_event(
+                f"{method} {endpoint}",
+                "http",
+                start=start,
+                duration=latency,
+                args={"sent": sent, "received": received, "error": error},
+            )
+
+    def record_retry(self, endpoint: str) -> None:
+        with self.lock:
+            self.endpoints.setdefault(endpoint, EndpointMetrics()).retries += 1
+
+    def add_received(self, endpoint: str, nr_bytes: int) -> None:
+        """Count bytes of a streamed response, received after record_request."""
+        with self.lock:
+            self.endpoints.setdefault(endpoint, EndpointMetrics()).bytes_received += nr_bytes
+
+    @contextlib.contextmanager
+    def span(self, name: str) -> Iterator[None]:
+        """Time a phase, e.g. "next_level.prepare". Also usable as a decorator."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            duration = time.perf_counter() - start
+            with self.lock:
+                self.phases.setdefault(name, []).append(duration)
+                self._add_event(name, "phase", start=start, duration=duration, args={})
+
+    def _add_event(
+        self, name: str, category: str, *, start: float, duration: float, args: dict[str, Any]
+    ) -> None:
+        if not self.is_tracing:
+            return
+        thread = threading.current_thread()
+        self.thread_names.setdefault(thread.ident or 0, thread.name)
+        self.events.append(
+            {
+                "name": name,
+                "cat": category,
+                "ph": "X",
+                "ts": (start - self.start) * 1e6,  # microseconds
+                "dur": duration * 1e6,
+                "pid": os.getpid(),
+                "tid": thread.ident or 0,
+                "args": args,
+            }
+        )
+
+    def report(self) -> dict[str, Any]:
+        with self.lock:
+            return {
+                "command": sys.argv,
+                "wall": time.perf_counter() - self.start,
+                "endpoints": {
+                    name: metrics.summary() for name, metrics in sorted(self.endpoints.items())
+                },
+                "phases": {
+                    name: {"count": len(durations), "total": sum(durations), "max": max(durations)}
+                    for name, durations in sorted(self.phases.items())
+                },
+            }
+
+    def trace(self) -> dict[str, Any]:
+        with self.lock:
+            thread_events = [
+                {
+                    "name": "thread_name",
+                    "ph": "M",
+                    "pid": os.getpid(),
+                    "tid": tid,
+                    "args": {"name": name},
+                }
+                for tid, name in self.thread_names.items()
+            ]
+            return {"traceEvents": thread_events + self.events, "displayTimeUnit": "ms"}
+
+    def write(self, report_path: str | None, trace_path: str | None) -> None:
+        for path, content in ((report_path, self.report), (trace_path, self.trace)):
+            if path is None:
+                continue
+            try:
+                Path(path).write_text(json.dumps(content(), indent=1), encoding="utf-8")
+            except OSError as e:
+                logger.warning(f"Could not write metrics to {path}: {e}")
+
+
+METRICS = Metrics(is_tracing=METRICS_TRACE_PATH is not None)
+if METRICS_REPORT_PATH is not None or METRICS_TRACE_PATH is not None:
+    atexit.register(METRICS.write, METRICS_REPORT_PATH, METRICS_TRACE_PATH)
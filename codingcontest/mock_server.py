@@ -0,0 +1,355 @@
+import io
+import json
+import random
+import re
+import secrets
+import sys
+import threading
+import time
+import zipfile
+from collections import Counter
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from email.parser import BytesParser
+from http import HTTPStatus
+from http.cookies import SimpleCookie
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any
+from urllib.parse import parse_qs
+
+import typer
+from loguru import logger
+
+
+@dataclass
+class MockLevel:
+    stages: dict[str, tuple[bytes, bytes]]  # stage name -> (input, expected output)
+    example: tuple[bytes, bytes]
+
+    @classmethod
+    def generate(
+        cls, level_nr: int, *, nr_stages: int, input_size: int, rng: random.Random
+    ) -> "MockLevel":
+        """Random inputs of about input_size bytes, the expected output is their sum."""
+
+        def generate_stage() -> tuple[bytes, bytes]:
+            numbers = [rng.randrange(10**6) for _ in range(max(1, input_size // 7))]
+            content = f"{len(numbers)}\n" + "\n".join(map(str, numbers)) + "\n"
+            return content.encode(), f"{sum(numbers)}\n".encode()
+
+        return cls(
+            stages={f"level{level_nr}_{idx}": generate_stage() for idx in range(1, nr_stages + 1)},
+            example=generate_stage(),
+        )
+
+    def archive(self, level_nr: int) -> bytes:
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+            archive.writestr(f"level{level_nr}/level{level_nr}_example.in", self.example[0])
+            archive.writestr(f"level{level_nr}/level{level_nr}_example.out", self.example[1])
+            for stage_name, (content, _) in self.stages.items():
+                archive.writestr(f"level{level_nr}/{stage_name}.in", content)
+        return buffer.getvalue()
+
+
+@dataclass
+class MockContest:
+    """State of a contest served by MockServer, with latency and failure injection."""
+
+    levels: list[MockLevel]
+    username: str = "mock-user"
+    password: str = "mock-password"
+    contest_id: str = "1"
+    is_output_files: bool = True
+    latency: float = 0.0  # seconds added to every response
+    failure_rate: float = 0.0  # fraction of api requests answered with 503
+    download_drop_rate: float = 0.0  # fraction of downloads cut off halfway
+    session_max_requests: int = 0  # api requests after which a session expires, 0: never
+    expired_session_redirect: bool = False  # like catcoder, else expired sessions get a 401
+    level_idx: int = 0
+    solved: set[str] = field(default_factory=set)
+    sessions: Counter[str] = field(default_factory=Counter)  # valid SESSION -> api requests
+    expired_sessions: int = 0
+    request_counts: Counter[str] = field(default_factory=Counter)
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
+    @property
+    def level_nr(self) -> int:
+        return min(self.level_idx, len(self.levels) - 1) + 1
+
+    @property
+    def level(self) -> MockLevel:
+        return self.levels[self.level_nr - 1]
+
+    def use_session(self, session: str | None) -> bool:
+        """Count an api request of session, False if the session is not (or no longer) valid."""
+        with self.lock:
+            if session is None or session not in self.sessions:
+                return False
+            self.sessions[session] += 1
+            if self.session_max_requests and self.sessions[session] > self.session_max_requests:
+                del self.sessions[session]
+                self.expired_sessions += 1
+                return False
+            return True
+
+    def judge(self, stage_name: str, solution: bytes) -> str:
+        with self.lock:
+            expected = self.level.stages.get(stage_name, (b"", None))[1]
+            if expected is None or solution.split() != expected.split():
+                return "INVALID"
+            self.solved.add(stage_name)
+            if self.solved >= self.level.stages.keys():
+                self.level_idx += 1
+                self.solved = set()
+            return "VALID"
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    """Implements the catcoder + register endpoints used by CatCoder."""
+
+    protocol_version = "HTTP/1.1"
+    server: "MockServer"
+
+    def do_GET(self) -> None:  # noqa: N802
+        self.dispatch(
+            [
+                (r"/oauth2/authorization/cc-registration", self.oauth_authorization),
+                (r"/auth/login", self.login_page),
+                (r"/api/game/input/info/\w+", self.input_info),
+                (r"/api/game/level/\w+", self.level_state),
+                (r"/api/contest/\w+/file-request/(description|input)", self.file_request),
+                (r"/download/(description|input)/(\d+)", self.download),
+            ]
+        )
+
+    def do_POST(self) -> None:  # noqa: N802
+        self.dispatch(
+            [
+                (r"/auth/login", self.login),
+                (r"/api/game/\w+/upload/solution/([\w-]+)", self.upload_solution),
+                (r"/api/game/\w+/submit", self.submit),
+                (r"/api/game/\w+/1/upload", self.upload_source),
+            ]
+        )
+
+    def dispatch(self, routes: list[tuple[str, Callable[..., None]]]) -> None:
+        contest = self.server.contest
+        path = self.path.split("?")[0]
+        time.sleep(contest.latency)
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        for pattern, endpoint in routes:
+            if match := re.fullmatch(pattern, path):
+                with contest.lock:
+                    contest.request_counts[endpoint.__name__] += 1
+                is_api = path.startswith("/api/")
+                if is_api and random.random() < contest.failure_rate:  # noqa: S311
+                    self.reply(HTTPStatus.SERVICE_UNAVAILABLE)
+                elif is_api and not contest.use_session(self.session()):
+                    self.reject_session()
+                else:
+                    endpoint(body, *match.groups())
+                return
+        self.reply(HTTPStatus.NOT_FOUND)
+
+    def reply(
+        self,
+        status: HTTPStatus,
+        content: bytes | dict[str, Any] = b"",
+        headers: dict[str, str] | None = None,
+    ) -> None:
+        if isinstance(content, dict):
+            content = json.dumps(content).encode()
+            headers = {"Content-Type": "application/json", **(headers or {})}
+        self.send_response(status)
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def session(self) -> str | None:
+        cookie = SimpleCookie(self.headers.get("Cookie", ""))
+        return cookie["SESSION"].value if "SESSION" in cookie else None
+
+    def reject_session(self) -> None:
+        if self.server.contest.expired_session_redirect:
+            self.reply(HTTPStatus.FOUND, headers={"Location": f"{self.server.url}/auth/login"})
+        else:
+            self.reply(HTTPStatus.UNAUTHORIZED)
+
+    def login_page(self, _: bytes) -> None:
+        self.reply(HTTPStatus.OK, b"<html>Login</html>", headers={"Content-Type": "text/html"})
+
+    def oauth_authorization(self, _: bytes) -> None:
+        self.reply(
+            HTTPStatus.OK, headers={"Set-Cookie": f"SESSION={secrets.token_hex(8)}; Path=/"}
+        )
+
+    def login(self, body: bytes) -> None:
+        contest = self.server.contest
+        form = parse_qs(body.decode())
+        if form.get("username") != [contest.username] or form.get("password") != [
+            contest.password
+        ]:
+            self.reply(HTTPStatus.OK)  # like catcoder, the SESSION cookie just stays the same
+            return
+        session = secrets.token_hex(8)
+        with contest.lock:
+            contest.sessions[session] = 0
+        self.reply(HTTPStatus.OK, headers={"Set-Cookie": f"SESSION={session}; Path=/"})
+
+    def input_info(self, _: bytes) -> None:
+        contest = self.server.contest
+        self.reply(
+            HTTPStatus.OK,
+            {
+                "level": contest.level_nr,
+                "hasInputFile": True,
+                "fileSolution": contest.is_output_files,
+                "tests": [
+                    {"inputsDto": [{"name": stage_name, "input": f"{stage_name}.in"}]}
+                    for stage_name in contest.level.stages
+                ],
+            },
+        )
+
+    def level_state(self, _: bytes) -> None:
+        contest = self.server.contest
+        self.reply(
+            HTTPStatus.OK,
+            {
+                "nrOfLevels": len(contest.levels),
+                "gameFinished": contest.level_idx >= len(contest.levels),
+            },
+        )
+
+    def file_request(self, _: bytes, filetype: str) -> None:
+        level_nr = self.server.contest.level_nr
+        self.reply(HTTPStatus.OK, {"url": f"{self.server.url}/download/{filetype}/{level_nr}"})
+
+    def download(self, _: bytes, filetype: str, level_nr: str) -> None:
+        contest = self.server.contest
+        level = contest.levels[int(level_nr) - 1]
+        if filetype == "input":
+            content, filename = level.archive(int(level_nr)), f"level{level_nr}.zip"
+        else:
+            content, filename = f"Level {level_nr}".encode(), f"level{level_nr}.pdf"
+        start = int(re.findall(r"bytes=(\d+)-", self.headers.get("Range", "bytes=0-"))[0])
+        self.send_response(HTTPStatus.PARTIAL_CONTENT if start else HTTPStatus.OK)
+        self.send_header("Content-Disposition", f'attachment; filename="{filename}"')
+        self.send_header("Content-Length", str(len(content) - start))
+        if start:
+            self.send_header("Content-Range", f"bytes {start}-{len(content) - 1}/{len(content)}")
+        self.end_headers()
+        if random.random() < contest.download_drop_rate:  # noqa: S311
+            self.wfile.write(content[start : start + (len(content) - start) // 2])
+            self.close_connection = True
+            return
+        self.wfile.write(content[start:])
+
+    def upload_solution(self, body: bytes, stage_name: str) -> None:
+        message = BytesParser().parsebytes(
+            f"Content-Type: {self.headers['Content-Type']}\r\n\r\n".encode() + body
+        )
+        solution = b""
+        for part in message.walk():
+            if part.get_param("name", header="content-disposition") == "file":
+                payload = part.get_payload(decode=True)
+                assert isinstance(payload, bytes)
+                solution = payload
+        verdict = self.server.contest.judge(stage_name, solution)
+        self.reply(HTTPStatus.OK, {"results": {stage_name: verdict}})
+
+    def submit(self, body: bytes) -> None:
+        results = json.loads(body)["results"]
+        verdicts = {
+            stage_name: self.server.contest.judge(stage_name, solution.encode())
+            for stage_name, solution in results.items()
+        }
+        self.reply(HTTPStatus.OK, {"results": verdicts})
+
+    def upload_source(self, _: bytes) -> None:
+        self.reply(HTTPStatus.OK)
+
+    def log_message(self, format: str, *args: Any) -> None:  # noqa: A002, ANN401
+        logger.debug(f"mock catcoder: {format % args}")
+
+
+class MockServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, contest: MockContest, port: int = 0) -> None:
+        """Serve contest on localhost, port 0 picks a free port."""
+        super().__init__(("127.0.0.1", port), MockHandler)
+        self.contest = contest
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def env(self) -> dict[str, str]:
+        """Environment variables pointing CatCoder to this server."""
+        return {
+            "CCC_CATCODER_URL": self.url,
+            "CCC_REGISTER_URL": self.url,
+            "CCC_USERNAME": self.contest.username,
+            "CCC_PASSWORD": self.contest.password,
+            "CCC_CONTEST_ID": self.contest.contest_id,
+        }
+
+
+@contextmanager
+def serve(contest: MockContest, port: int = 0) -> Iterator[MockServer]:
+    """Run a MockServer for contest in a background thread."""
+    server = MockServer(contest, port=port)
+    thread = threading.Thread(target=server.serve_forever, name="mock-catcoder", daemon=True)
+    thread.start()
+    try:
+        yield server
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def mock_server_cli(  # noqa: PLR0913
+    port: int = typer.Option(8080, help="Port to listen on"),  # noqa: B008
+    levels: int = typer.Option(3, help="Number of levels"),  # noqa: B008
+    stages: int = typer.Option(5, help="Number of stages per level"),  # noqa: B008
+    input_size: int = typer.Option(10_000, help="Approximate bytes per input"),  # noqa: B008
+    latency: float = typer.Option(0.0, help="Seconds added to every response"),  # noqa: B008
+    failure_rate: float = typer.Option(  # noqa: B008
+        0.0, help="Fraction of api requests answered with 503"
+    ),
+    session_max_requests: int = typer.Option(  # noqa: B008
+        0, help="Api requests after which a session expires (0: never), to test the re-login"
+    ),
+    verbose: bool = typer.Option(False, "--verbose", "-v"),  # noqa: B008, FBT001, FBT003
+) -> None:
+    # Not utils.set_logging: importing utils fixes ROOT_DIR, see benchmark
+    logger.remove()
+    logger.add(sys.stderr, level="DEBUG" if verbose else "INFO")
+    rng = random.Random(0)
+    contest = MockContest(
+        levels=[
+            MockLevel.generate(nr, nr_stages=stages, input_size=input_size, rng=rng)
+            for nr in range(1, levels + 1)
+        ],
+        latency=latency,
+        failure_rate=failure_rate,
+        session_max_requests=session_max_requests,
+        expired_session_redirect=True,
+    )
+    server = MockServer(contest, port=port)
+    for key, value in server.env().items():
+        logger.info(f"{key}={value}")
+    server.serve_forever()
+
+
+def run() -> None:
+    typer.run(mock_server_cli)
+
+
+if __name__ == "__main__":
+    run()
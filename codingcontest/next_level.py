@@ -1,12 +1,16 @@
 import shutil
-from glob import glob
+import tempfile
+from concurrent.futures import Future, ThreadPoolExecutor
 from pathlib import Path
+from typing import Any
 
 import typer
 from loguru import logger
 
-from codingcontest.catcoder import CatCoder
-from codingcontest.utils import ROOT_DIR, commit, get_git_repo, set_logging
+from codingcontest.catcoder import CatCoder, LevelInfo
+from codingcontest.ledger import LEDGER_FILENAME, LEGACY_SUCCESS_FILENAME
+from codingcontest.metrics import METRICS
+from codingcontest.utils import ROOT_DIR, commit, get_git_repo, latest_level_path, set_logging
 
 
 def next_level_cli(
@@ -16,64 +20,131 @@ def next_level_cli(
     next_level()
 
 
-def next_level(catcoder: CatCoder | None = None) -> None:
-    gitrepo = get_git_repo(dirty_check=True)
+@METRICS.span("next_level")
+def next_level(
+    catcoder: CatCoder | None = None,
+    prefetched: Future[tuple[LevelInfo, Path]] | None = None,
+    *,
+    dirty_check: bool = True,
+) -> None:
+    """Create the directory of the current level and commit it.
 
-    max_level_present = max(
-        (
-            int(Path(lname).parts[-1][len("level") :])
-            for lname in glob(f"{ROOT_DIR.absolute()}/level[0-9]")
-            + glob(f"{ROOT_DIR.absolute()}/level[0-9][0-9]")
-        ),
-        default=None,
-    )
-    if max_level_present is not None:
-        copy_from = ROOT_DIR / f"level{max_level_present}"
-    else:
-        copy_from = ROOT_DIR / "template"
+    If prefetched is set (see prefetch_level), the level was already prepared in the
+    background and only needs to be committed. Without dirty_check, the pull + push of
+    earlier commits is not waited for (the caller just committed the working tree).
+    """
+    with METRICS.span("next_level.git_repo"):
+        gitrepo = get_git_repo(dirty_check=dirty_check)
+
+    if prefetched is not None:
+        try:
+            catcoder_level_info, new_level_path = prefetched.result()
+        except Exception as e:  # noqa: BLE001
+            logger.warning(f"Prefetching the next level failed ({e!r}), retrying")
+            prefetched = None
+    if prefetched is None:
+        copy_from = get_copy_from()
+        if catcoder is None:
+            with METRICS.span("next_level.login"):
+                catcoder = CatCoder()
+        catcoder_level_info, new_level_path = prepare_level(catcoder=catcoder, copy_from=copy_from)
+
+    logger.info(f"Created and filled '{new_level_path}'")
+    with METRICS.span("next_level.commit"):
+        commit(
+            gitrepo, message=f"level{catcoder_level_info.level_nr} start", add_path=new_level_path
+        )
+
+
+def prefetch_level(catcoder: CatCoder) -> Future[tuple[LevelInfo, Path]]:
+    """Start preparing the current level in a background thread, see next_level."""
+    executor = ThreadPoolExecutor(max_workers=1)
+    prefetched = executor.submit(prepare_level, catcoder=catcoder, copy_from=get_copy_from())
+    executor.shutdown(wait=False)
+    return prefetched
+
+
+def get_copy_from() -> Path:
+    """Return the directory with the code for the next level, the latest level or template."""
+    copy_from = latest_level_path() or ROOT_DIR / "template"
 
     if not copy_from.exists() or not copy_from.is_dir():
         logger.error(
             f"{copy_from.relative_to(ROOT_DIR)} not a valid directory, cannot copy template files!"
         )
         raise typer.Exit(code=1)
+    return copy_from
 
-    if catcoder is None:
-        catcoder = CatCoder()
-    catcoder_level_info = catcoder.current_level_info()
-    new_level_path = ROOT_DIR / f"level{catcoder_level_info.level_nr}"
-    if new_level_path.exists():
-        logger.warning(f"{new_level_path.relative_to(ROOT_DIR)} already exists, nothing to do.")
-        raise typer.Exit(code=1)
 
-    logger.debug(
-        f"Copying {copy_from.relative_to(ROOT_DIR)} to {new_level_path.relative_to(ROOT_DIR)}"
-    )
+@METRICS.span("next_level.prepare")
+def prepare_level(*, catcoder: CatCoder, copy_from: Path) -> tuple[LevelInfo, Path]:
+    """Create the directory of the current level, with code, description and inputs.
+
+    The input info is requested first, as it has the level number: if the level directory
+    already exists, nothing is downloaded. Then everything is assembled in a staging
+    directory by concurrent steps: the description download, the input download (if the
+    level has input files) and copying the code of copy_from. The staging directory is
+    renamed to the level directory once all steps finished.
+    """
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        level_state = executor.submit(catcoder.level_state)
+        input_info = catcoder.input_info()
+        new_level_path = ROOT_DIR / f"level{input_info['level']}"
+        if new_level_path.exists():
+            logger.warning(
+                f"{new_level_path.relative_to(ROOT_DIR)} already exists, nothing to do."
+            )
+            raise typer.Exit(code=1)
+        staging_path = Path(tempfile.mkdtemp(prefix=".next_level_", dir=ROOT_DIR))
+        steps: list[Future[Any]] = [
+            executor.submit(catcoder.download_description, staging_path),
+            executor.submit(_copy_code, copy_from, staging_path),
+        ]
+        if input_info["hasInputFile"]:
+            # .out files of the archive stay next to the inputs, as reference for the local judge
+            steps.append(
+                executor.submit(catcoder.download_inputs, staging_path / "in", staging_path / "in")
+            )
+    try:
+        for step in steps:
+            step.result()
+        catcoder_level_info = LevelInfo.from_api(input_info, level_state.result())
+        (staging_path / "in").mkdir(exist_ok=True)
+        (staging_path / "out").mkdir(exist_ok=True)
+        (staging_path / "out" / LEGACY_SUCCESS_FILENAME).unlink(missing_ok=True)
+        (staging_path / "out" / LEDGER_FILENAME).unlink(missing_ok=True)
+        if not catcoder_level_info.is_input_files:
+            # We create fake "input files" from the text input
+            for stage_name, input_content in zip(
+                catcoder_level_info.input_names,
+                catcoder_level_info.input_file_names,
+                strict=True,
+            ):
+                with (staging_path / "in" / f"{stage_name}.in").open(
+                    "w", encoding="utf-8"
+                ) as fout:
+                    fout.write(f"{input_content}\n")
+        logger.debug(
+            f"Copied {copy_from.relative_to(ROOT_DIR)} to {new_level_path.relative_to(ROOT_DIR)}"
+        )
+        staging_path.rename(new_level_path)
+    finally:
+        shutil.rmtree(staging_path, ignore_errors=True)
+    return catcoder_level_info, new_level_path
+
+
+@METRICS.span("next_level.copy_code")
+def _copy_code(copy_from: Path, staging_path: Path) -> None:
+    from codingcontest.harness import REPORT_DIRNAME  # the harness is slow to import
+
     shutil.copytree(
         copy_from,
-        new_level_path,
-        ignore=lambda _, names: [n for n in names if n.endswith((".in", ".out", ".pdf"))],
-    )
-    archive_path = catcoder.download_level_files(
-        new_level_path, is_input_files=catcoder_level_info.is_input_files
+        staging_path,
+        ignore=lambda _, names: [
+            n for n in names if n.endswith((".in", ".out", ".pdf", ".npz")) or n == REPORT_DIRNAME
+        ],
+        dirs_exist_ok=True,
     )
-    (new_level_path / "in").mkdir(exist_ok=True)
-    (new_level_path / "out").mkdir(exist_ok=True)
-    (new_level_path / "out" / ".successfully_submitted").unlink(missing_ok=True)
-    if archive_path is not None:
-        shutil.unpack_archive(filename=archive_path, extract_dir=new_level_path / "in")
-        archive_path.unlink()
-        for actually_out_file in glob(f"{new_level_path.absolute()}/in/*.out"):
-            shutil.move(actually_out_file, new_level_path / "out")
-    else:  # We create fake "input files" from the text input
-        for stage_name, input_content in zip(
-            catcoder_level_info.input_names, catcoder_level_info.input_file_names, strict=True
-        ):
-            with (new_level_path / "in" / f"{stage_name}.in").open("w", encoding="utf-8") as fout:
-                fout.write(f"{input_content}\n")
-
-    logger.info(f"Created and filled '{new_level_path}'")
-    commit(gitrepo, message=f"level{catcoder_level_info.level_nr} start", add_path=new_level_path)
 
 
 def run() -> None:
@@ -0,0 +1,113 @@
+import functools
+import itertools
+import os
+from collections.abc import Iterable, Iterator
+from pathlib import Path
+from types import TracebackType
+from typing import Any
+
+import numpy as np
+
+OUTPUT_CHUNK_SIZE = 64 * 1024  # values formatted at once
+OUTPUT_BUFFER_SIZE = 1024 * 1024
+
+
+class OutputWriter:
+    r"""Write an output file piece by piece, e.g. one row as soon as it is computed.
+
+    Values can be numpy arrays, lists or generators. They are formatted in chunks with
+    one %-format per chunk (%d for integer arrays, str otherwise, or the fmt given),
+    instead of one str() call and one big joined string for the whole output. Lines end
+    with newline (catcoder expects "\r\n"). The file is written to a temporary name and
+    only renamed to path when the with block finishes without an exception.
+
+        with OutputWriter(path) as fout:
+            fout.write_row(times, sep=",")
+    """
+
+    def __init__(
+        self, path: Path, *, newline: str = "\r\n", buffer_size: int = OUTPUT_BUFFER_SIZE
+    ) -> None:
+        """Open a temporary file next to path, with a buffer of buffer_size bytes."""
+        self.path = path
+        self.newline = newline.encode()
+        self.tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+        self.file = self.tmp_path.open("wb", buffering=buffer_size)
+
+    def __enter__(self) -> "OutputWriter":
+        return self
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        self.file.close()
+        if exc_type is None:
+            self.tmp_path.replace(self.path)
+        else:
+            self.tmp_path.unlink(missing_ok=True)
+
+    def write_line(self, line: str = "") -> None:
+        self.file.write(line.encode() + self.newline)
+
+    def write_row(
+        self, values: Iterable[Any] | np.ndarray, *, sep: str = " ", fmt: str | None = None
+    ) -> None:
+        """Write values separated by sep as one line."""
+        is_first = True
+        for chunk in format_chunks(values, sep=sep, fmt=fmt):
+            if not is_first:
+                self.file.write(sep.encode())
+            self.file.write(chunk)
+            is_first = False
+        self.file.write(self.newline)
+
+    def write_rows(
+        self,
+        rows: Iterable[Iterable[Any]] | np.ndarray,
+        *,
+        sep: str = " ",
+        fmt: str | None = None,
+    ) -> None:
+        """Write each row (e.g. of a 2d array) as a line, values separated by sep."""
+        if isinstance(rows, np.ndarray) and rows.ndim == 2:  # noqa: PLR2004
+            newline = self.newline.decode()
+            nr_rows = max(1, OUTPUT_CHUNK_SIZE // max(1, rows.shape[1]))
+            for start in range(0, len(rows), nr_rows):
+                block = rows[start : start + nr_rows]
+                line_template = sep.join([fmt or _array_format(block)] * block.shape[1])
+                template = newline.join([line_template] * len(block)) + newline
+                self.file.write((template % tuple(block.ravel().tolist())).encode())
+            return
+        for row in rows:
+            self.write_row(row, sep=sep, fmt=fmt)
+
+
+def format_chunks(
+    values: Iterable[Any] | np.ndarray, *, sep: str, fmt: str | None = None
+) -> Iterator[bytes]:
+    """Format values in chunks of OUTPUT_CHUNK_SIZE, each one joined with sep."""
+    if isinstance(values, np.ndarray):
+        values = values.ravel()
+        for start in range(0, len(values), OUTPUT_CHUNK_SIZE):
+            chunk = values[start : start + OUTPUT_CHUNK_SIZE]
+            yield _format_chunk(chunk.tolist(), sep, fmt or _array_format(chunk))
+        return
+    iterator = iter(values)
+    while chunk_values := list(itertools.islice(iterator, OUTPUT_CHUNK_SIZE)):
+        yield _format_chunk(chunk_values, sep, fmt or "%s")
+
+
+def _array_format(values: np.ndarray) -> str:
+    return "%d" if np.issubdtype(values.dtype, np.integer) else "%s"
+
+
+def _format_chunk(values: list[Any], sep: str, fmt: str) -> bytes:
+    return (_chunk_template(fmt, sep, len(values)) % tuple(values)).encode()
+
+
+@functools.lru_cache(maxsize=16)
+def _chunk_template(fmt: str, sep: str, count: int) -> str:
+    return sep.join([fmt] * count)
@@ -0,0 +1,117 @@
+import hashlib
+import mmap
+import os
+import warnings
+from pathlib import Path
+
+import numpy as np
+import numpy.typing as npt
+from loguru import logger
+
+PARSE_CHUNK_SIZE = 64 * 1024 * 1024
+INT_CHARS = frozenset(b"-0123456789")
+SEPARATORS = b" \t\r\n,"
+INT64 = np.iinfo(np.int64)
+# bytes.translate table, replacing the separators with spaces
+TO_SPACES = bytes(ord(" ") if char in SEPARATORS else char for char in range(256))
+
+
+def read_ints(filename: str | Path, *, cache: bool = True) -> npt.NDArray[np.int64]:
+    """Return all integers of a file (separated by whitespace or ',') as array.
+
+    The file is memory-mapped and tokenized with numpy in chunks. With cache, the result
+    is stored in a sidecar file (filename + ".npz") keyed by the sha256 of the file, so
+    parsing the same input again only needs to hash it.
+    """
+    path = Path(filename)
+    sidecar_path = path.with_name(f"{path.name}.npz")
+    if path.stat().st_size == 0:
+        return np.empty(0, dtype=np.int64)
+    with path.open("rb") as fin, mmap.mmap(fin.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        digest = hashlib.sha256(mm).hexdigest() if cache else ""
+        if cache and sidecar_path.exists():
+            try:
+                with np.load(sidecar_path) as sidecar:
+                    if str(sidecar["sha256"]) == digest:
+                        return sidecar["values"]  # type: ignore[no-any-return]
+            except (OSError, ValueError, KeyError) as e:
+                logger.debug(f"Ignoring broken parse cache {sidecar_path}: {e}")
+        values = tokenize_ints(mm)
+    if cache:
+        tmp_path = sidecar_path.with_name(f".{sidecar_path.name}.{os.getpid()}.npz")
+        np.savez(tmp_path, sha256=digest, values=values)
+        tmp_path.replace(sidecar_path)
+    return values
+
+
+def tokenize_ints(buffer: bytes | mmap.mmap) -> npt.NDArray[np.int64]:
+    """Parse all integers in buffer with numpy, in chunks to bound the memory overhead.
+
+    Raises ValueError if buffer contains anything else than integers and separators, e.g.
+    "1.5" or "3-4", or an integer outside of int64, instead of returning wrong numbers.
+    """
+    parts = []
+    start = 0
+    while start < len(buffer):
+        end = min(start + PARSE_CHUNK_SIZE, len(buffer))
+        while end < len(buffer) and buffer[end] not in SEPARATORS:  # do not split a token
+            end += 1
+        chunk = buffer[start:end]
+        if unexpected := chunk.translate(None, delete=bytes(INT_CHARS) + SEPARATORS):
+            msg = f"Unexpected {unexpected[:1]!r} after byte {start}, only integers are supported"
+            raise ValueError(msg)
+        chunk = chunk.translate(TO_SPACES).strip()
+        if chunk:  # numpy would parse a whitespace only chunk as [0]
+            parts.append(_parse_chunk(chunk, start))
+        start = end
+    return np.concatenate(parts) if parts else np.empty(0, dtype=np.int64)
+
+
+def _parse_chunk(chunk: bytes, offset: int) -> npt.NDArray[np.int64]:
+    msg = f"Malformed integer (e.g. '3-4' or '-') after byte {offset}"
+    if b"- " in chunk or chunk.endswith(b"-"):  # numpy parses a lone "-" as 0, "- 2" as -2
+        raise ValueError(msg)
+    with warnings.catch_warnings():
+        # numpy < 2 only warns about unparsable data and returns the integers before it
+        warnings.simplefilter("error", DeprecationWarning)
+        try:
+            values = np.fromstring(chunk, dtype=np.int64, sep=" ")
+        except (ValueError, DeprecationWarning) as e:
+            raise ValueError(msg) from e
+    # numpy clamps integers outside of int64, check the tokens if it may have done that
+    if (values == INT64.max).any() or (values == INT64.min).any():
+        for token in chunk.split():
+            if not INT64.min <= int(token) <= INT64.max:
+                msg = f"Integer {token[:30]!r} after byte {offset} does not fit into int64"
+                raise ValueError(msg)
+    return values
+
+
+class IntTokens:
+    """Cursor over the integers of an input file, handing out array views."""
+
+    __slots__ = ("ints", "pos")
+
+    def __init__(self, ints: npt.NDArray[np.int64]) -> None:
+        """Start at the first of ints, e.g. the result of read_ints."""
+        self.ints = ints
+        self.pos = 0
+
+    @classmethod
+    def from_file(cls, filename: str | Path, *, cache: bool = True) -> "IntTokens":
+        return cls(read_ints(filename, cache=cache))
+
+    def next_int(self) -> int:
+        self.pos += 1
+        return int(self.ints[self.pos - 1])
+
+    def take(self, count: int) -> npt.NDArray[np.int64]:
+        assert self.pos + count <= len(self.ints), "Not enough integers left"
+        self.pos += count
+        return self.ints[self.pos - count : self.pos]
+
+    def take_matrix(self, rows: int, cols: int) -> npt.NDArray[np.int64]:
+        return self.take(rows * cols).reshape(rows, cols)
+
+    def rest(self) -> npt.NDArray[np.int64]:
+        return self.take(len(self.ints) - self.pos)
@@ -0,0 +1,248 @@
+import functools
+import json
+import os
+import shutil
+import statistics
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, List  # noqa: UP035
+
+import typer
+from loguru import logger
+
+from codingcontest.harness import (
+    REPORT_DIRNAME,
+    SOLVER_FILENAME,
+    solve_in_parallel,
+    solve_with_level_solver,
+)
+from codingcontest.ledger import SubmissionLedger
+from codingcontest.utils import ROOT_DIR, open_repo, set_logging
+
+HISTORY_PATH = ROOT_DIR / ".regression_history.jsonl"
+
+IntList = List[int]  # noqa: UP006, workaround typer not supporting "list[int]"
+
+
+def regression_cli(  # noqa: PLR0913
+    verbose: bool = typer.Option(False, "--verbose", "-v"),  # noqa: B008, FBT001, FBT003
+    level: IntList = typer.Option(  # noqa: B008
+        [], help="Only check these levels (repeatable), default all"
+    ),
+    timeout: float = typer.Option(  # noqa: B008
+        60.0, help="Seconds allowed for solving one input"
+    ),
+    tolerance: float = typer.Option(  # noqa: B008
+        0.25, help="Allowed relative slowdown / memory growth against earlier runs"
+    ),
+    min_slowdown: float = typer.Option(  # noqa: B008
+        0.05, help="Seconds an input has to get slower to be reported"
+    ),
+    history_runs: int = typer.Option(  # noqa: B008
+        5, help="Compare with the median of this many earlier runs"
+    ),
+    memo: bool = typer.Option(  # noqa: B008, FBT001
+        default=False, help="Use the memoization cache (hides slow solver code)"
+    ),
+    trace_memory: bool = typer.Option(  # noqa: B008, FBT001
+        default=False, help="Measure exact peak memory per input (slower)"
+    ),
+) -> None:
+    """Re-run the solver of every level and compare with the accepted outputs.
+
+    Each level is solved in a temporary copy, the outputs are compared byte for byte with
+    the outputs catcoder accepted (and the reference outputs of the examples). Runtime
+    and memory per input are appended to .regression_history.jsonl and compared with
+    earlier runs. Exits with 1 on any correctness or performance regression.
+    """
+    set_logging(verbose=verbose)
+    is_ok = regression_check(
+        levels=level,
+        timeout=timeout,
+        tolerance=tolerance,
+        min_slowdown=min_slowdown,
+        history_runs=history_runs,
+        memo=memo,
+        trace_memory=trace_memory,
+    )
+    if not is_ok:
+        raise typer.Exit(code=1)
+
+
+def regression_check(
+    *,
+    levels: list[int],
+    timeout: float,
+    tolerance: float,
+    min_slowdown: float,
+    history_runs: int,
+    memo: bool,
+    trace_memory: bool,
+) -> bool:
+    level_paths = sorted(
+        (path for path in ROOT_DIR.glob("level*") if path.name[len("level") :].isdigit()),
+        key=lambda path: int(path.name[len("level") :]),
+    )
+    if levels:
+        level_paths = [path for path in level_paths if int(path.name[len("level") :]) in levels]
+    history = read_history(HISTORY_PATH)
+    memory_mode = "traced" if trace_memory else "rss"
+    results: dict[str, dict[str, Any]] = {}
+    with tempfile.TemporaryDirectory(prefix="ccc_regression_") as tmp:
+        if not memo:
+            os.environ["CCC_MEMO_CACHE_DIR"] = str(Path(tmp) / "memo_cache")
+        for level_path in level_paths:
+            if "def solve_file(" not in (level_path / SOLVER_FILENAME).read_text(encoding="utf-8"):
+                logger.warning(f"{level_path.name}/{SOLVER_FILENAME} has no solve_file, skipping")
+                continue
+            logger.info(f"Checking {level_path.name}")
+            results.update(
+                run_level(level_path, Path(tmp), timeout=timeout, trace_memory=trace_memory)
+            )
+    nr_wrong = sum(result["status"] in {"wrong", "unsolved"} for result in results.values())
+    nr_slower = 0
+    for key, result in results.items():
+        if result["status"] == "wrong":
+            logger.error(f"{key}: output differs from the accepted output ❌")
+        elif result["status"] == "unsolved":
+            logger.error(f"{key}: not solved anymore ({result['reason']}) ❌")
+        nr_slower += not compare_with_history(
+            key,
+            result,
+            [run["inputs"][key] for run in history if key in run["inputs"]][-history_runs:],
+            memory_mode=memory_mode,
+            tolerance=tolerance,
+            min_slowdown=min_slowdown,
+        )
+    append_history(HISTORY_PATH, results, memory_mode=memory_mode)
+    logger.info(
+        f"Checked {len(results)} inputs of {len(level_paths)} levels: "
+        f"{nr_wrong} correctness regressions, {nr_slower} performance regressions"
+    )
+    return nr_wrong == 0 and nr_slower == 0
+
+
+def accepted_outputs(level_path: Path) -> dict[str, Path]:
+    """Output file accepted by catcoder by stem, and the reference outputs in in/."""
+    accepted = {path.stem: path for path in (level_path / "in").glob("*.out")}
+    ledger = SubmissionLedger(level_path / "out")
+    for path in (level_path / "out").glob("*.out"):
+        verdicts = ledger.verdicts.get(path.stem, {})
+        if verdicts.get(ledger.digest(path)) or verdicts.get(""):  # "": legacy, no hash
+            accepted[path.stem] = path
+    return accepted
+
+
+def run_level(
+    level_path: Path, tmp: Path, *, timeout: float, trace_memory: bool
+) -> dict[str, dict[str, Any]]:
+    """Solve all inputs of level_path in a copy below tmp, results by level/stem."""
+    run_path = tmp / level_path.name
+    shutil.copytree(
+        level_path,
+        run_path,
+        ignore=lambda directory, names: (
+            [name for name in names if name in {"in", "out", REPORT_DIRNAME}]
+            if Path(directory) == level_path
+            else []
+        ),
+    )
+    (run_path / "in").symlink_to((level_path / "in").absolute(), target_is_directory=True)
+    (run_path / "out").mkdir()
+    solved = solve_in_parallel(
+        functools.partial(solve_with_level_solver, str(run_path / SOLVER_FILENAME)),
+        sorted(str(path) for path in (run_path / "in").glob("*.in")),
+        timeout=timeout,
+        trace_memory=trace_memory,
+    )
+    report_path = run_path / REPORT_DIRNAME / "report.json"
+    profiles = (
+        {entry["stem"]: entry for entry in json.loads(report_path.read_text())["inputs"]}
+        if report_path.exists()
+        else {}
+    )
+    accepted = accepted_outputs(level_path)
+    results = {}
+    for stem, is_solved in solved.items():
+        profile = profiles[stem]
+        output_path = run_path / "out" / f"{stem}.out"
+        if not is_solved:
+            status = "unsolved" if stem in accepted else "failed"
+        elif stem not in accepted:
+            status = "unchecked"
+        elif output_path.exists() and output_path.read_bytes() == accepted[stem].read_bytes():
+            status = "ok"
+        else:
+            status = "wrong"
+        results[f"{level_path.name}/{stem}"] = {
+            "status": status,
+            "reason": profile["status"],
+            "wall": profile["wall"],
+            "peak_mb": profile["peak_traced_mb"] if trace_memory else profile["peak_rss_mb"],
+        }
+    return results
+
+
+def compare_with_history(
+    key: str,
+    result: dict[str, Any],
+    earlier: list[dict[str, Any]],
+    *,
+    memory_mode: str,
+    tolerance: float,
+    min_slowdown: float,
+) -> bool:
+    """Log if result is slower or needs more memory than the earlier runs, False if so."""
+    earlier_walls = [run["wall"] for run in earlier if run["reason"] == "solved"]
+    earlier_memory = [run["peak_mb"] for run in earlier if run.get("memory") == memory_mode]
+    if result["reason"] != "solved" or not earlier_walls:
+        return True
+    is_ok = True
+    median_wall = statistics.median(earlier_walls)
+    if result["wall"] > median_wall * (1 + tolerance) and (
+        result["wall"] - median_wall > min_slowdown
+    ):
+        logger.warning(f"{key}: took {result['wall']:.3f}s, before {median_wall:.3f}s 🐌")
+        is_ok = False
+    if earlier_memory and result["peak_mb"] > statistics.median(earlier_memory) * (1 + tolerance):
+        logger.warning(
+            f"{key}: needed {result['peak_mb']:.0f} MB, "
+            f"before {statistics.median(earlier_memory):.0f} MB 🐘"
+        )
+        is_ok = False
+    return is_ok
+
+
+def read_history(path: Path) -> list[dict[str, Any]]:
+    if not path.exists():
+        return []
+    history = []
+    for line in path.read_text(encoding="utf-8").splitlines():
+        try:
+            history.append(json.loads(line))
+        except ValueError:
+            logger.warning(f"Ignoring broken line in {path}")
+    return history
+
+
+def append_history(path: Path, results: dict[str, dict[str, Any]], *, memory_mode: str) -> None:
+    try:
+        commit = open_repo(ROOT_DIR.parent).head.commit.hexsha
+    except Exception:  # noqa: BLE001, no git repo or no commits yet
+        commit = None
+    run = {
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "commit": commit,
+        "inputs": {key: {**result, "memory": memory_mode} for key, result in results.items()},
+    }
+    with path.open("a", encoding="utf-8") as fout:
+        fout.write(json.dumps(run) + "\n")
+
+
+def run() -> None:
+    typer.run(regression_cli)
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,239 @@
+import hashlib
+import json
+import os
+import shlex
+import shutil
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Optional
+
+import typer
+from loguru import logger
+
+from codingcontest import client
+from codingcontest.harness import REPORT_DIRNAME, InputProfile, summary_table, write_report
+from codingcontest.submit_solutions import submit_solutions
+from codingcontest.utils import ROOT_DIR, latest_level_path, set_logging
+
+SPEC_FILENAME = "solver.json"  # in the level directory
+BUILD_CACHE_DIR = Path(os.getenv("CCC_BUILD_CACHE_DIR") or ROOT_DIR / ".build_cache")
+BUILD_CACHE_KEEP = 20  # most recently used builds kept
+BUILD_COMPLETE_MARKER = ".complete"
+
+IntOrNone = Optional[int]  # workaround typer not supporting "int | None"
+
+
+@dataclass
+class SolverSpec:
+    """Contents of solver.json, placeholders: {build_dir}, {level_dir}.
+
+    {
+        "build": "g++ -O2 -std=c++20 -o {build_dir}/solver main.cpp",
+        "sources": ["*.cpp", "*.h"],
+        "run": "{build_dir}/solver",
+        "timeout": 60,
+        "memory_mb": 2048
+    }
+    build is optional (e.g. "run": "pypy3 solve.py"). The commands run in the level
+    directory, the input is passed on stdin and stdout is the output file.
+    """
+
+    run: str
+    build: str | None = None
+    sources: list[str] = field(default_factory=list)
+    timeout: float | None = 60.0
+    memory_mb: int | None = None
+
+    @classmethod
+    def from_file(cls, path: Path) -> "SolverSpec":
+        return cls(**json.loads(path.read_text(encoding="utf-8")))
+
+
+def run_solver_cli(  # noqa: PLR0913
+    verbose: bool = typer.Option(False, "--verbose", "-v"),  # noqa: B008, FBT001, FBT003
+    level: IntOrNone = typer.Option(  # noqa: B008
+        None, help="Level to run, default the latest level directory"
+    ),
+    pattern: str = typer.Option(  # noqa: B008
+        "*.in", help="Glob for the input files in in/ to solve, e.g. '*_example.in'"
+    ),
+    submit: bool = typer.Option(  # noqa: B008, FBT001
+        default=True, help="Run submit-solutions with the new outputs"
+    ),
+    rebuild: bool = typer.Option(  # noqa: B008, FBT001
+        default=False, help="Build even if the sources did not change"
+    ),
+    max_workers: IntOrNone = typer.Option(  # noqa: B008
+        None, min=1, help="Number of inputs solved concurrently, default the number of CPUs"
+    ),
+) -> None:
+    """Build and run the solver of solver.json in the level directory on all inputs.
+
+    Builds are cached by the hash of the sources and commands, in codingcontest/.build_cache.
+    """
+    set_logging(verbose=verbose)
+    level_path = latest_level_path() if level is None else ROOT_DIR / f"level{level}"
+    if level_path is None or not (level_path / SPEC_FILENAME).exists():
+        logger.error(
+            f"No {SPEC_FILENAME} in the level directory, see the docstring of "
+            "codingcontest.runner.SolverSpec for its format"
+        )
+        raise typer.Exit(code=1)
+    spec = SolverSpec.from_file(level_path / SPEC_FILENAME)
+    build_dir = build(spec, level_path, rebuild=rebuild)
+    results = run_all(
+        spec, level_path, build_dir, pattern=pattern, max_workers=max_workers or os.cpu_count()
+    )
+    if submit:
+        exit_code = client.call("submit-solutions", [])
+        if exit_code is None:
+            submit_solutions()
+        elif exit_code != 0:
+            raise typer.Exit(code=exit_code)
+    if not all(results.values()):
+        raise typer.Exit(code=1)
+
+
+def build(spec: SolverSpec, level_path: Path, *, rebuild: bool) -> Path:
+    """Run the build command unless the cache has a build of the same sources, return its dir."""
+    digest = hashlib.sha256(json.dumps([spec.build, spec.run]).encode())
+    for source_path in sorted(
+        {path for pattern in spec.sources for path in level_path.glob(pattern)}
+    ):
+        digest.update(str(source_path.relative_to(level_path)).encode() + b"\0")
+        digest.update(source_path.read_bytes())
+    build_dir = BUILD_CACHE_DIR / digest.hexdigest()[:16]
+    if spec.build is None:
+        return build_dir
+    if (build_dir / BUILD_COMPLETE_MARKER).exists() and not rebuild:
+        logger.info("Sources did not change, using the cached build")
+        os.utime(build_dir)
+        return build_dir
+    shutil.rmtree(build_dir, ignore_errors=True)
+    build_dir.mkdir(parents=True)
+    logger.info(f"Building: {spec.build}")
+    start = time.perf_counter()
+    result = subprocess.run(
+        shlex.split(format_command(spec.build, level_path, build_dir)),
+        cwd=level_path,
+        capture_output=True,
+        text=True,
+        check=False,
+    )
+    if result.returncode != 0:
+        shutil.rmtree(build_dir, ignore_errors=True)
+        logger.error(f"Build failed ❌\n{result.stdout}{result.stderr}")
+        raise typer.Exit(code=1)
+    (build_dir / BUILD_COMPLETE_MARKER).touch()
+    logger.info(f"Built in {time.perf_counter() - start:.1f}s")
+    prune_build_cache()
+    return build_dir
+
+
+def prune_build_cache() -> None:
+    builds = sorted(BUILD_CACHE_DIR.iterdir(), key=lambda path: path.stat().st_mtime)
+    for build_dir in builds[:-BUILD_CACHE_KEEP]:
+        shutil.rmtree(build_dir, ignore_errors=True)
+
+
+def format_command(command: str, level_path: Path, build_dir: Path) -> str:
+    return command.format(build_dir=build_dir.absolute(), level_dir=level_path.absolute())
+
+
+def run_all(
+    spec: SolverSpec,
+    level_path: Path,
+    build_dir: Path,
+    *,
+    pattern: str,
+    max_workers: int | None,
+) -> dict[str, bool]:
+    """Run the solver on all inputs concurrently, returns for each input stem if it succeeded.
+
+    Like the python harness, timings and memory are written to .harness/report.json.
+    """
+    report_path = level_path / REPORT_DIRNAME
+    report_path.mkdir(exist_ok=True)
+    (level_path / "out").mkdir(exist_ok=True)
+    command = limit_memory(
+        shlex.split(format_command(spec.run, level_path, build_dir)), spec.memory_mb
+    )
+    input_paths = sorted((level_path / "in").glob(pattern))
+    profiles = []
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [
+            executor.submit(run_input, command, input_path, spec=spec, report_path=report_path)
+            for input_path in input_paths
+        ]
+        for future in as_completed(futures):
+            input_profile = future.result()
+            profiles.append(input_profile)
+            if input_profile.status == "solved":
+                logger.info(f"Solved {input_profile.stem} in {input_profile.wall:.2f}s")
+            else:
+                logger.warning(f"{input_profile.stem}: {input_profile.status} ❌")
+                if input_profile.error:
+                    logger.warning(input_profile.error)
+    write_report(report_path / "report.json", profiles)
+    logger.info(f"Solved inputs, slowest first:\n{summary_table(profiles)}")
+    return {input_profile.stem: input_profile.status == "solved" for input_profile in profiles}
+
+
+def run_input(
+    command: list[str], input_path: Path, *, spec: SolverSpec, report_path: Path
+) -> InputProfile:
+    """Run the solver with input_path on stdin, stdout becomes out/<stem>.out on success."""
+    input_profile = InputProfile(stem=input_path.stem)
+    output_path = input_path.parent.parent / "out" / f"{input_path.stem}.out"
+    tmp_path = output_path.with_name(f".{output_path.name}.tmp")
+    stderr_path = report_path / f"{input_path.stem}.stderr"
+    start = time.perf_counter()
+    with input_path.open("rb") as fin, tmp_path.open("wb") as fout, stderr_path.open("wb") as ferr:
+        process = subprocess.Popen(
+            command, stdin=fin, stdout=fout, stderr=ferr, cwd=input_path.parent.parent
+        )
+        timer = None if spec.timeout is None else threading.Timer(spec.timeout, process.kill)
+        if timer is not None:
+            timer.start()
+        _, status, rusage = os.wait4(process.pid, 0)  # rusage of this process only
+        if timer is not None:
+            timer.cancel()
+    process.returncode = os.waitstatus_to_exitcode(status)
+    input_profile.wall = time.perf_counter() - start
+    input_profile.phases = {"run": input_profile.wall}
+    # KiB on linux, includes the few 10 MB of the forked python process before the exec
+    input_profile.peak_rss_mb = rusage.ru_maxrss / 1024
+    if process.returncode == 0:
+        tmp_path.replace(output_path)
+        input_profile.status = "solved"
+        return input_profile
+    tmp_path.unlink(missing_ok=True)
+    if spec.timeout is not None and input_profile.wall >= spec.timeout:
+        input_profile.status = "timeout"
+    else:
+        input_profile.status = "error"
+        stderr_tail = stderr_path.read_text(errors="replace").splitlines()[-10:]
+        input_profile.error = f"exit code {process.returncode}\n" + "\n".join(stderr_tail)
+    return input_profile
+
+
+def limit_memory(command: list[str], memory_mb: int | None) -> list[str]:
+    """Wrap command in a shell limiting its address space (ulimit -v), before the exec.
+
+    Not a preexec_fn, that is not safe with the threads the solvers are started from.
+    """
+    if memory_mb is None:
+        return command
+    return ["sh", "-c", f'ulimit -v {memory_mb * 1024} && exec "$@"', "sh", *command]
+
+
+def run() -> None:
+    typer.run(run_solver_cli)
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,129 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Any
+
+import typer
+
+from codingcontest.benchmark import compare
+
+TEMPLATE_SOLVER = Path(__file__).parent / "template" / "solve.py"
+# What a command imports before doing anything, when no contest-daemon is running
+ENTRY_POINTS = {
+    "next-level": "import codingcontest.client, codingcontest.next_level",
+    "submit-solutions": "import codingcontest.client, codingcontest.submit_solutions",
+    "solve.py": f"import runpy; runpy.run_path({str(TEMPLATE_SOLVER)!r}, run_name='startup')",
+    "watch": "import codingcontest.watch",
+    "regression-check": "import codingcontest.regression",
+    "run-solver": "import codingcontest.runner",
+    "contest-daemon": "import codingcontest.daemon",
+}
+TOP_IMPORTS = 5  # heaviest top-level packages shown per entry point
+
+
+def startup_benchmark_cli(
+    repeat: int = typer.Option(  # noqa: B008
+        5, help="Number of fresh interpreters per entry point"
+    ),
+    output: Path = typer.Option(None, help="Write the results as json to this file"),  # noqa: B008
+    baseline: Path = typer.Option(  # noqa: B008
+        None, help="Results json of an earlier run to compare against"
+    ),
+    tolerance: float = typer.Option(  # noqa: B008
+        0.2, help="Allowed relative slowdown of an entry point median against the baseline"
+    ),
+) -> None:
+    """Time the imports of each entry point in fresh interpreters, with -X importtime.
+
+    The total is the import time python reports for the modules of the entry point, the
+    interpreter startup itself is not included. One untimed run per entry point first
+    compiles the .pyc files.
+    """
+    results = startup_benchmark(repeat=repeat)
+    for name, stats in results["phases"].items():
+        heaviest = ", ".join(
+            f"{package} {seconds * 1000:.0f}ms" for package, seconds in stats["heaviest"].items()
+        )
+        typer.echo(
+            f"{name:>18}: median {stats['median'] * 1000:.0f}ms "
+            f"(min {stats['min'] * 1000:.0f}ms, max {stats['max'] * 1000:.0f}ms) {heaviest}"
+        )
+    if output is not None:
+        output.write_text(json.dumps(results, indent=2), encoding="utf-8")
+    if baseline is not None and not compare(
+        results, json.loads(baseline.read_text(encoding="utf-8")), tolerance=tolerance
+    ):
+        raise typer.Exit(code=1)
+
+
+def startup_benchmark(*, repeat: int) -> dict[str, Any]:
+    """Import time (seconds) of each entry point, in the format of benchmark.compare."""
+    env = {key: value for key, value in os.environ.items() if not key.startswith("CCC_METRICS_")}
+    phases = {}
+    for name, code in ENTRY_POINTS.items():
+        import_times(code, env=env)
+        samples = []
+        packages: dict[str, list[float]] = {}
+        for _ in range(repeat):
+            total, by_package = import_times(code, env=env)
+            samples.append(total)
+            for package, seconds in by_package.items():
+                packages.setdefault(package, []).append(seconds)
+        heaviest = sorted(
+            ((package, statistics.median(values)) for package, values in packages.items()),
+            key=lambda item: -item[1],
+        )[:TOP_IMPORTS]
+        phases[name] = {
+            "median": statistics.median(samples),
+            "min": min(samples),
+            "max": max(samples),
+            "samples": samples,
+            "heaviest": dict(heaviest),
+        }
+    return {"phases": phases, "python": sys.version, "time": time.strftime("%Y-%m-%dT%H:%M:%S")}
+
+
+def import_times(code: str, *, env: dict[str, str]) -> tuple[float, dict[str, float]]:
+    """Run code in a fresh interpreter, return its import time and that of each package.
+
+    Packages are the top-level modules (e.g. requests) imported by the code, the time is
+    cumulative, including their own imports.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True,
+        text=True,
+        env=env,
+        check=True,
+    )
+    total = 0.0
+    by_package: dict[str, float] = {}
+    is_code = False
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if name.strip() == "site":  # imported by the interpreter itself, before the code
+            is_code = True
+            continue
+        if not is_code or cumulative.strip() == "cumulative":
+            continue
+        seconds = int(cumulative) / 1e6
+        depth = (len(name) - len(name.lstrip())) // 2
+        if depth == 0:
+            total += seconds
+        if "." not in name.strip() and not name.strip().startswith(("_", "codingcontest")):
+            by_package[name.strip()] = by_package.get(name.strip(), 0.0) + seconds
+    return total, by_package
+
+
+def run() -> None:
+    typer.run(startup_benchmark_cli)
+
+
+if __name__ == "__main__":
+    run()
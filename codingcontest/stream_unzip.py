@@ -0,0 +1,182 @@
+import struct
+import zlib
+from collections.abc import Callable
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from io import BufferedWriter
+
+LOCAL_FILE_HEADER = b"PK\x03\x04"
+CENTRAL_DIRECTORY_HEADERS = (b"PK\x01\x02", b"PK\x05\x06", b"PK\x06\x06")
+DATA_DESCRIPTOR = b"PK\x07\x08"
+LOCAL_FILE_HEADER_SIZE = 30
+FLAG_DATA_DESCRIPTOR = 0x08
+FLAG_UTF8 = 0x800
+ZIP64_EXTRA_ID = 0x0001
+ZIP64_MARKER = 0xFFFFFFFF
+METHOD_STORED = 0
+METHOD_DEFLATED = 8
+
+
+class StreamingUnzipper:
+    """Extract a zip archive from a stream of chunks, without ever seeking back.
+
+    Members are located via their local file headers, the central directory at the end
+    of the archive is not needed. destination maps the name of a member to the path it
+    is written to, or None to skip the member. Supports stored and deflated members,
+    data descriptors and zip64 sizes.
+    """
+
+    def __init__(self, destination: Callable[[str], Path | None]) -> None:
+        """Extract the members to the paths destination returns, as they are fed."""
+        self.destination = destination
+        self.extracted: list[Path] = []
+        self._buffer = bytearray()
+        self._done = False
+        self._fout: BufferedWriter | None = None
+        self._in_member = False
+        self._flags = 0
+        self._crc = 0
+        self._expected_crc = 0
+        self._remaining = 0  # compressed bytes left, if known from the local header
+        self._is_zip64 = False
+        self._decompressor: zlib._Decompress | None = None  # noqa: SLF001, no public name
+        self._stream_ended = False
+
+    def feed(self, chunk: bytes) -> None:
+        self._buffer += chunk
+        while not self._done and self._process():
+            pass
+
+    def close(self) -> None:
+        if self._fout is not None:
+            self._fout.close()
+        if not self._done:
+            msg = "Zip stream ended before the central directory"
+            raise ValueError(msg)
+
+    def _process(self) -> bool:
+        """Consume as much of the buffer as possible, False if more data is needed."""
+        return self._process_member_data() if self._in_member else self._process_header()
+
+    def _process_header(self) -> bool:
+        if len(self._buffer) < len(LOCAL_FILE_HEADER):
+            return False
+        signature = bytes(self._buffer[: len(LOCAL_FILE_HEADER)])
+        if signature in CENTRAL_DIRECTORY_HEADERS:
+            self._done = True
+            self._buffer.clear()
+            return False
+        if signature != LOCAL_FILE_HEADER:
+            msg = f"Unexpected zip signature {signature!r}"
+            raise ValueError(msg)
+        if len(self._buffer) < LOCAL_FILE_HEADER_SIZE:
+            return False
+        flags, method, crc, compressed_size, name_len, extra_len = struct.unpack_from(
+            "<2xHH4xII4xHH", self._buffer, 4
+        )
+        header_end = LOCAL_FILE_HEADER_SIZE + name_len + extra_len
+        if len(self._buffer) < header_end:
+            return False
+        raw_name = bytes(self._buffer[LOCAL_FILE_HEADER_SIZE : LOCAL_FILE_HEADER_SIZE + name_len])
+        name = raw_name.decode("utf-8" if flags & FLAG_UTF8 else "cp437")
+        extra = bytes(self._buffer[LOCAL_FILE_HEADER_SIZE + name_len : header_end])
+        del self._buffer[:header_end]
+
+        zip64_sizes = _zip64_sizes(extra)
+        self._is_zip64 = zip64_sizes is not None
+        compressed_size = _compressed_size(name, compressed_size, zip64_sizes)
+        if method not in {METHOD_STORED, METHOD_DEFLATED}:
+            msg = f"Unsupported compression method {method} for {name}"
+            raise ValueError(msg)
+        if flags & FLAG_DATA_DESCRIPTOR and method == METHOD_STORED:
+            msg = f"Cannot stream stored member {name} with unknown size"
+            raise ValueError(msg)
+
+        self._flags = flags
+        self._expected_crc = crc
+        self._remaining = compressed_size
+        self._crc = 0
+        self._decompressor = zlib.decompressobj(-15) if method == METHOD_DEFLATED else None
+        self._stream_ended = False
+        target = None if name.endswith("/") else self.destination(name)
+        if target is not None:
+            self._fout = target.open("wb")
+            self.extracted.append(target)
+        self._in_member = True
+        return True
+
+    def _process_member_data(self) -> bool:
+        if self._flags & FLAG_DATA_DESCRIPTOR:
+            return self._process_until_stream_end()
+        data = bytes(self._buffer[: self._remaining])
+        del self._buffer[: len(data)]
+        self._remaining -= len(data)
+        self._write(self._decompressor.decompress(data) if self._decompressor else data)
+        if self._remaining > 0:
+            return False
+        if self._decompressor is not None:
+            self._write(self._decompressor.flush())
+        self._finish_member(self._expected_crc)
+        return True
+
+    def _process_until_stream_end(self) -> bool:
+        if not self._decompress_buffer():
+            return False
+        sizes_len = 16 if self._is_zip64 else 8
+        has_signature = self._buffer[: len(DATA_DESCRIPTOR)] == DATA_DESCRIPTOR
+        descriptor_len = (len(DATA_DESCRIPTOR) if has_signature else 0) + 4 + sizes_len
+        if len(self._buffer) < descriptor_len:
+            return False
+        (crc,) = struct.unpack_from("<I", self._buffer, descriptor_len - 4 - sizes_len)
+        del self._buffer[:descriptor_len]
+        self._finish_member(crc)
+        return True
+
+    def _decompress_buffer(self) -> bool:
+        """Decompress the buffer, True once the end of the deflate stream was reached."""
+        assert self._decompressor is not None
+        if not self._stream_ended:
+            data = bytes(self._buffer)
+            self._buffer.clear()
+            self._write(self._decompressor.decompress(data))
+            self._stream_ended = self._decompressor.eof
+            if self._stream_ended:
+                self._buffer[:0] = self._decompressor.unused_data
+        return self._stream_ended
+
+    def _write(self, data: bytes) -> None:
+        self._crc = zlib.crc32(data, self._crc)
+        if self._fout is not None:
+            self._fout.write(data)
+
+    def _finish_member(self, expected_crc: int) -> None:
+        if self._fout is not None:
+            self._fout.close()
+            self._fout = None
+        if self._crc != expected_crc:
+            msg = "CRC mismatch while extracting zip stream"
+            raise ValueError(msg)
+        self._in_member = False
+
+
+def _compressed_size(name: str, compressed_size: int, zip64_sizes: tuple[int, int] | None) -> int:
+    """Return the compressed size, from the zip64 extra field if the local header has none."""
+    if compressed_size != ZIP64_MARKER:
+        return compressed_size
+    if zip64_sizes is None:
+        msg = f"Missing zip64 extra field for {name}"
+        raise ValueError(msg)
+    return zip64_sizes[1]
+
+
+def _zip64_sizes(extra: bytes) -> tuple[int, int] | None:
+    """Return (uncompressed, compressed) size from the zip64 extra field, if present."""
+    offset = 0
+    while offset + 4 <= len(extra):
+        header_id, size = struct.unpack_from("<HH", extra, offset)
+        if header_id == ZIP64_EXTRA_ID and size >= 16:  # noqa: PLR2004
+            return struct.unpack_from("<QQ", extra, offset + 4)  # type: ignore[return-value]
+        offset += 4 + size
+    return None
@@ -1,20 +1,31 @@
 import os
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
 from glob import glob
 from pathlib import Path
-from typing import Optional
+from typing import TYPE_CHECKING, Optional
 
 import typer
-from git import Repo
 from loguru import logger
 
 from codingcontest.catcoder import CatCoder, LevelInfo
-from codingcontest.next_level import next_level
-from codingcontest.utils import ROOT_DIR, commit, get_git_repo, set_logging
+from codingcontest.judge import JudgeMode, judge_outputs
+from codingcontest.ledger import SubmissionLedger
+from codingcontest.metrics import METRICS
+from codingcontest.utils import (
+    ROOT_DIR,
+    commit,
+    get_git_repo,
+    latest_level_path,
+    set_logging,
+)
+
+if TYPE_CHECKING:
+    from git import Repo
 
 StrOrNone = Optional[str]  # workaround typer not supporting "str | None"
 
 
-def submit_solutions_cli(
+def submit_solutions_cli(  # noqa: PLR0913
     resubmit_successful: bool = typer.Option(  # noqa: B008, FBT001
         default=False, help="Force re-checking previously successful stages"
     ),
@@ -29,6 +40,19 @@ def submit_solutions_cli(
         default=None,
         help="Specify filename from level folder for upload, otherwise we use from env",
     ),
+    max_parallel_uploads: int = typer.Option(  # noqa: B008
+        default=4, min=1, help="Number of stages uploaded concurrently"
+    ),
+    prefetch_next_level: bool = typer.Option(  # noqa: B008, FBT001
+        default=False, help="Start fetching the next level as soon as this level is complete"
+    ),
+    judge: JudgeMode = typer.Option(  # noqa: B008
+        default=JudgeMode.WHITESPACE,
+        help="How to compare outputs with the reference outputs of the level before uploading",
+    ),
+    float_tolerance: float = typer.Option(  # noqa: B008
+        default=1e-6, help="Relative and absolute tolerance for --judge float"
+    ),
 ) -> None:
     set_logging(verbose=verbose)
     submit_solutions(
@@ -36,9 +60,14 @@ def submit_solutions_cli(
         continue_on_error=continue_on_error,
         only_for_stage=only_for_stage,
         upload_solution_for_bonus=upload_solution_for_bonus,
+        max_parallel_uploads=max_parallel_uploads,
+        prefetch_next_level=prefetch_next_level,
+        judge=judge,
+        float_tolerance=float_tolerance,
     )
 
 
+@METRICS.span("submit_solutions")
 def submit_solutions(
     *,
     resubmit_successful: bool = False,
@@ -46,75 +75,199 @@ def submit_solutions(
     only_for_stage: str = "",
     upload_solution_for_bonus: str | None = None,
     catcoder: CatCoder | None = None,
+    max_parallel_uploads: int = 4,
+    prefetch_next_level: bool = False,
+    judge: JudgeMode = JudgeMode.WHITESPACE,
+    float_tolerance: float = 1e-6,
 ) -> None:
-    gitrepo = get_git_repo(dirty_check=False)
+    # Judge outputs with a local reference first, before any network call
+    failed_locally = judge_locally(
+        only_for_stage=only_for_stage,
+        judge=judge,
+        float_tolerance=float_tolerance,
+        continue_on_error=continue_on_error,
+    )
+    with METRICS.span("submit_solutions.git_repo"):
+        gitrepo = get_git_repo(dirty_check=False)
     if catcoder is None:
-        catcoder = CatCoder()
+        with METRICS.span("submit_solutions.login"):
+            catcoder = CatCoder()
 
-    catcoder_level_info = catcoder.current_level_info()
+    with METRICS.span("submit_solutions.level_info"):
+        catcoder_level_info = catcoder.current_level_info()
     output_files_path = ROOT_DIR / f"level{catcoder_level_info.level_nr}" / "out"
     if not output_files_path.exists():
         logger.warning(
             f"{output_files_path.relative_to(ROOT_DIR)} does not exist, maybe next-level? 🙃"
         )
         raise typer.Exit(code=1)
-    to_check, required_for_completion = get_stages_to_check(
+    ledger = SubmissionLedger(output_files_path)
+    to_check, required_for_completion, known_invalid = get_stages_to_check(
         catcoder_level_info=catcoder_level_info,
         only_for_stage=only_for_stage,
         output_files_path=output_files_path,
         resubmit_successful=resubmit_successful,
+        ledger=ledger,
     )
-    successful_stages = []
-    did_fail = False
-    for filestem, stage in to_check:
-        if catcoder.upload_solution(
-            output_files_path / f"{filestem}.out",
-            stage,
-            is_output_files=catcoder_level_info.is_output_files,
-        ):
-            logger.info(f"{filestem} success ✅")
-            successful_stages.append(filestem)
-        else:
-            logger.info(f"{filestem} failed ❌")
-            did_fail = True
-            if not continue_on_error:
-                break
+    to_check = [
+        (filestem, stage) for filestem, stage in to_check if filestem not in failed_locally
+    ]
+    digests = {
+        filestem: ledger.digest(output_files_path / f"{filestem}.out") for filestem, _ in to_check
+    }
+    verdicts = upload_stages(
+        catcoder=catcoder,
+        to_check=to_check,
+        output_files_path=output_files_path,
+        is_output_files=catcoder_level_info.is_output_files,
+        continue_on_error=continue_on_error,
+        max_parallel_uploads=max_parallel_uploads,
+    )
+    for filestem, is_valid in verdicts.items():
+        ledger.record(filestem, digests[filestem], is_valid=is_valid)
+    if verdicts:
+        ledger.save()
+    successful_stages = [filestem for filestem, is_valid in verdicts.items() if is_valid]
+    # outputs rejected before are not uploaded again, but fail like a fresh rejection
+    did_fail = bool(known_invalid or failed_locally) or not all(verdicts.values())
     if required_for_completion == set(successful_stages):
+        prefetched = None
+        if (
+            prefetch_next_level
+            and catcoder_level_info.level_nr != catcoder_level_info.max_level_nr
+        ):
+            from codingcontest.next_level import prefetch_level
+
+            prefetched = prefetch_level(catcoder)
         level_complete(
             gitrepo=gitrepo,
             catcoder_level_info=catcoder_level_info,
             output_files_path=output_files_path,
             upload_solution_for_bonus=upload_solution_for_bonus,
             catcoder=catcoder,
+            prefetched=prefetched,
         )
         return
 
     if successful_stages:
-        previously_successful = get_previously_successful(
-            output_files_path=output_files_path,
-            resubmit_successful=resubmit_successful,
-        )
-        with (output_files_path / ".successfully_submitted").open("w", encoding="utf-8") as fout:
-            fout.writelines(
-                [f"{line}\n" for line in sorted(list(previously_successful) + successful_stages)]
+        with METRICS.span("submit_solutions.commit"):
+            commit(
+                gitrepo,
+                f"level{catcoder_level_info.level_nr} wip "
+                f"({', '.join(successful_stages)} complete)",
+                add_path=output_files_path,
+                add_updated=True,
             )
-        commit(
-            gitrepo,
-            f"level{catcoder_level_info.level_nr} wip ({', '.join(successful_stages)} complete)",
-            add_path=output_files_path,
-            add_updated=True,
-        )
     if did_fail:
         raise typer.Exit(-1)
 
 
+@METRICS.span("submit_solutions.judge")
+def judge_locally(
+    *, only_for_stage: str, judge: JudgeMode, float_tolerance: float, continue_on_error: bool
+) -> set[str]:
+    """Return the filestems of the latest level which differ from their reference output.
+
+    Without continue_on_error, a difference ends the command before anything is uploaded.
+    """
+    if (level_path := latest_level_path()) is None:
+        return set()
+    judged = judge_outputs(
+        level_path,
+        {only_for_stage} if only_for_stage else None,
+        mode=judge,
+        tolerance=float_tolerance,
+    )
+    failed_locally = {filestem for filestem, is_match in judged.items() if not is_match}
+    if failed_locally and not continue_on_error:
+        raise typer.Exit(-1)
+    return failed_locally
+
+
+@METRICS.span("submit_solutions.upload")
+def upload_stages(
+    *,
+    catcoder: CatCoder,
+    to_check: list[tuple[str, str]],
+    output_files_path: Path,
+    is_output_files: bool,
+    continue_on_error: bool,
+    max_parallel_uploads: int,
+) -> dict[str, bool]:
+    """Upload the stages of to_check with up to max_parallel_uploads requests in flight.
+
+    Without continue_on_error, uploads which did not start yet are cancelled after the
+    first failed stage. Levels with text answers instead of output files are submitted
+    in one batch request. Returns the verdicts of all finished uploads by filestem, in the
+    order of to_check.
+    """
+    if not is_output_files and to_check:
+        stage_results = catcoder.upload_solutions(
+            {output_files_path / f"{filestem}.out": stage for filestem, stage in to_check}
+        )
+        results = {filestem: stage_results[stage] for filestem, stage in to_check}
+    else:
+        results = upload_stages_concurrently(
+            catcoder=catcoder,
+            to_check=to_check,
+            output_files_path=output_files_path,
+            continue_on_error=continue_on_error,
+            max_parallel_uploads=max_parallel_uploads,
+        )
+    verdicts = {filestem: results[filestem] for filestem, _ in to_check if filestem in results}
+    for filestem, is_valid in verdicts.items():
+        logger.info(f"{filestem} success ✅" if is_valid else f"{filestem} failed ❌")
+    return verdicts
+
+
+def upload_stages_concurrently(
+    *,
+    catcoder: CatCoder,
+    to_check: list[tuple[str, str]],
+    output_files_path: Path,
+    continue_on_error: bool,
+    max_parallel_uploads: int,
+) -> dict[str, bool]:
+    results: dict[str, bool] = {}
+    with ThreadPoolExecutor(max_workers=max_parallel_uploads) as executor:
+        pending: dict[Future[bool], str] = {
+            executor.submit(
+                catcoder.upload_solution,
+                output_files_path / f"{filestem}.out",
+                stage,
+                is_output_files=True,
+            ): filestem
+            for filestem, stage in to_check
+        }
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                results[pending.pop(future)] = future.result()
+            if not continue_on_error and not all(results.values()):
+                for future in pending:
+                    future.cancel()
+                # uploads already in flight cannot be cancelled, collect their verdicts
+                for future, filestem in pending.items():
+                    if not future.cancelled():
+                        results[filestem] = future.result()
+                break
+    return results
+
+
 def get_stages_to_check(
     *,
     catcoder_level_info: LevelInfo,
     only_for_stage: str,
     output_files_path: Path,
     resubmit_successful: bool,
-) -> tuple[list[tuple[str, str]], set[str]]:
+    ledger: SubmissionLedger,
+) -> tuple[list[tuple[str, str]], set[str], list[str]]:
+    """Find the output files which need to be uploaded.
+
+    Returns the (filestem, stage name) pairs to upload, the filestems still required to
+    complete the level, and the filestems whose exact output was rejected before (unless
+    resubmit_successful, these are not uploaded again).
+    """
     assert catcoder_level_info.input_names
     if len(catcoder_level_info.input_names[0]) <= len("99"):  # Indices, not file names
         existing_input_files = sorted(
@@ -135,26 +288,24 @@ def get_stages_to_check(
         existing_filestems = {f"{Path(fstr).stem}" for fstr in glob(f"{output_files_path}/*.out")}
     if existing_filestems.isdisjoint(expected_stages) and not only_for_stage:
         logger.warning("No output files to check!")
-    previously_successful = get_previously_successful(
-        output_files_path, resubmit_successful=resubmit_successful
-    )
+    previously_successful = set() if resubmit_successful else ledger.successful_stages()
     to_check = []
+    known_invalid = []
     for expected in sorted(expected_stages):
         if expected in existing_filestems:
-            if expected in previously_successful and not resubmit_successful:
+            if expected in previously_successful:
                 logger.info(f"Previously successful {expected}, skipping")
+            elif not resubmit_successful and (
+                ledger.lookup(expected, ledger.digest(output_files_path / f"{expected}.out"))
+                is False
+            ):
+                logger.info(f"{expected} failed ❌ (unchanged since it was rejected, skipping)")
+                known_invalid.append(expected)
             else:
                 to_check.append((expected, expected_stages[expected]))
 
     logger.debug(f"Submission candidates: {to_check}")
-    return to_check, expected_stages.keys() - previously_successful
-
-
-def get_previously_successful(output_files_path: Path, *, resubmit_successful: bool) -> set[str]:
-    if not resubmit_successful and (output_files_path / ".successfully_submitted").exists():
-        with (output_files_path / ".successfully_submitted").open(encoding="utf-8") as fin:
-            return {line.strip() for line in fin.readlines() if line.strip()}
-    return set()
+    return to_check, expected_stages.keys() - previously_successful, known_invalid
 
 
 def upload_solution_for_bonus_minutes(
@@ -178,32 +329,44 @@ def upload_solution_for_bonus_minutes(
         )
 
 
-def level_complete(
-    gitrepo: Repo | None,
+def level_complete(  # noqa: PLR0913
+    gitrepo: "Repo | None",
     catcoder_level_info: LevelInfo,
     output_files_path: Path,
     upload_solution_for_bonus: str | None,
     catcoder: CatCoder,
+    prefetched: Future[tuple[LevelInfo, Path]] | None = None,
 ) -> None:
-    """All steps necessary after a level has been completed."""
-    commit(
-        gitrepo,
-        f"level{catcoder_level_info.level_nr} done",
-        add_path=output_files_path,
-        add_updated=True,
-    )
-    upload_solution_for_bonus_minutes(
-        solution_file=upload_solution_for_bonus,
-        output_files_path=output_files_path,
-        catcoder=catcoder,
-    )
+    """All steps necessary after a level has been completed.
+
+    prefetched is the next level being prepared in the background, see prefetch_level.
+    """
+    with METRICS.span("submit_solutions.commit"):
+        commit(
+            gitrepo,
+            f"level{catcoder_level_info.level_nr} done",
+            add_path=output_files_path,
+            add_updated=True,
+        )
+    with METRICS.span("submit_solutions.upload_source"):
+        upload_solution_for_bonus_minutes(
+            solution_file=upload_solution_for_bonus,
+            output_files_path=output_files_path,
+            catcoder=catcoder,
+        )
 
     if catcoder_level_info.level_nr == catcoder_level_info.max_level_nr:
         logger.info("🎉🥳 Congrats, all levels complete! 🥳🎉")
         raise typer.Exit
+    if prefetched is not None:
+        wait([prefetched])
     logger.info(f"🥳 Level {catcoder_level_info.level_nr} complete! 🎉\n")
 
-    next_level(catcoder=catcoder)
+    # Imported here, most submissions do not complete a level
+    from codingcontest.next_level import next_level
+
+    # The level done commit covers the working tree, its push stays in the background
+    next_level(catcoder=catcoder, prefetched=prefetched, dirty_check=False)
 
 
 def run() -> None:
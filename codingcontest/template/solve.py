@@ -1,31 +1,43 @@
+from collections.abc import Iterator
 from dataclasses import dataclass
 from glob import glob
 from pathlib import Path
 
+import numpy as np
+import numpy.typing as npt
 from loguru import logger
 
+from codingcontest import client
 from codingcontest.catcoder import CatCoder
+from codingcontest.harness import phase, solve_anytime, solve_in_parallel
+from codingcontest.judge import JudgeMode
+from codingcontest.output import OutputWriter
+from codingcontest.parsing import IntTokens
 from codingcontest.submit_solutions import submit_solutions
 from codingcontest.utils import set_logging
 
 
-@dataclass
+@dataclass(slots=True)
 class Input:
     number_road_segments: int
 
-    cars: list[str]
+    cars: npt.NDArray[np.int64]  # one row per car
 
     input_file_stem: str
 
     @classmethod
     def from_file(cls: type["Input"], filename: str) -> "Input":
-        cars = []
-        with Path(filename).open(encoding="utf-8") as fin:
-            number_road_segments = int(next(fin))
-            number_cars = int(next(fin))
-            for car_str in fin:
-                cars.append(car_str)
-            assert len(cars) == number_cars
+        """Parse an input of only integers, IntTokens raises ValueError on anything else.
+
+        For inputs with text or floats, read the lines of the file instead.
+        """
+        tokens = IntTokens.from_file(filename)
+        number_road_segments = tokens.next_int()
+        number_cars = tokens.next_int()
+        rest = tokens.rest()
+        assert number_cars > 0, "No cars"
+        assert len(rest) % number_cars == 0, "Not one row per car"
+        cars = rest.reshape(number_cars, -1)
         return Input(
             number_road_segments=number_road_segments,
             cars=cars,
@@ -35,39 +47,96 @@ class Input:
 
 @dataclass
 class Output:
-    times: list[int]
+    times: npt.NDArray[np.int64]
 
     def write_file(self, output_stem: str) -> None:
-        with (Path(__file__).parent / Path("out") / f"{output_stem}.out").open(
-            "w", encoding="utf-8", newline="\r\n"
-        ) as fout:
-            fout.write(",".join([str(time) for time in self.times]) + "\n")
+        # For huge outputs, an OutputWriter can also be used in solve to write rows early
+        with OutputWriter(Path(__file__).parent / "out" / f"{output_stem}.out") as fout:
+            fout.write_row(self.times, sep=",")
+
+
+# Expensive pure helpers can be decorated with codingcontest.memo.memoize, their results
+# are cached on disk and reused by the next levels
+def solve(inclass: Input) -> Output:
+    return Output(times=np.full(len(inclass.cars), 20))
 
 
-def solve(inclass: Input) -> bool:
-    outclass = Output(times=[20 for c in inclass.cars])
-    outclass.write_file(inclass.input_file_stem)
+def solve_file(inputfile: str) -> bool:
+    logger.info(f"Solving {Path(inputfile).stem}")
+    # Phase times end up in .harness/report.json, use more phases to find slow parts
+    with phase("parse"):
+        inclass = Input.from_file(inputfile)
+    with phase("solve"):
+        outclass = solve(inclass)
+    with phase("write"):
+        outclass.write_file(inclass.input_file_stem)
     return True
 
 
+def solve_candidates(inputfile: str) -> Iterator[tuple[float, Output]]:
+    """For optimization levels: yield (score, output) for each better solution found."""
+    with phase("parse"):
+        inclass = Input.from_file(inputfile)
+    yield 0.0, solve(inclass)
+
+
 def main() -> None:
     considered_files = set(glob(f"{Path(__file__).parent}/in/*_example.in"))
     # considered_files = set(glob(f"{Path(__file__).parent}/in/*.in"))
 
     abort_on_first_fail = True
+    timeout_per_input = 60.0  # seconds
+    prefetch_next_level = False  # fetch next level while the level done commit is running
+    profile = False  # cProfile each input, to .harness/<input>.prof
+    trace_memory = False  # exact peak memory per input, but slower
+    anytime_budget: float | None = None  # seconds per input, search with solve_candidates
+    submit_interval = 30.0  # seconds between submissions of improved anytime candidates
 
     set_logging(verbose=False)
-    catcoder = CatCoder()
-
-    for inputfile in sorted(considered_files):
-        logger.info(f"Solving {Path(inputfile).stem}")
-        inclass = Input.from_file(inputfile)
-        if solve(inclass):
-            try:
-                submit_solutions(only_for_stage=Path(inputfile).stem, catcoder=catcoder)
-            except Exception:  # noqa: BLE001
-                if abort_on_first_fail:
-                    return
+    catcoder: CatCoder | None = None  # logged in with the first submission
+
+    # anytime candidates are scored by catcoder, not equal to the example outputs
+    judge = JudgeMode.WHITESPACE if anytime_budget is None else JudgeMode.OFF
+
+    def is_accepted(inputfile: Path) -> bool:
+        nonlocal catcoder
+        args = ["--only-for-stage", inputfile.stem, "--judge", judge.value]
+        if prefetch_next_level:
+            args.append("--prefetch-next-level")
+        if (exit_code := client.call("submit-solutions", args)) is not None:
+            return exit_code == 0
+        try:
+            if catcoder is None:
+                catcoder = CatCoder()
+            submit_solutions(
+                only_for_stage=inputfile.stem,
+                catcoder=catcoder,
+                prefetch_next_level=prefetch_next_level,
+                judge=judge,
+            )
+        except Exception:  # noqa: BLE001
+            return False
+        return True
+
+    if anytime_budget is None:
+        solve_in_parallel(
+            solve_file,
+            sorted(considered_files),
+            on_solved=lambda inputfile: is_accepted(inputfile) or not abort_on_first_fail,
+            timeout=timeout_per_input,
+            profile=profile,
+            trace_memory=trace_memory,
+        )
+    else:
+        solve_anytime(
+            solve_candidates,
+            sorted(considered_files),
+            budget=anytime_budget,
+            on_checkpoint=is_accepted,
+            submit_interval=submit_interval,
+            profile=profile,
+            trace_memory=trace_memory,
+        )
 
 
 if __name__ == "__main__":
@@ -1,12 +1,21 @@
+import atexit
+import functools
 import os
+import queue
 import sys
+import threading
+from glob import glob
 from pathlib import Path
+from typing import TYPE_CHECKING
 
 import typer
-from git import Repo
 from loguru import logger
 
-ROOT_DIR = Path(__file__).parent
+if TYPE_CHECKING:  # GitPython is only imported if git mode is enabled, see open_repo
+    from git import Repo
+
+ROOT_DIR = Path(os.getenv("CCC_ROOT_DIR", Path(__file__).parent))  # contains the level dirs
+GIT_FLUSH_TIMEOUT = float(os.getenv("CCC_GIT_FLUSH_TIMEOUT", "60"))  # seconds
 
 
 def set_logging(*, verbose: bool = False) -> None:
@@ -15,33 +24,133 @@ def set_logging(*, verbose: bool = False) -> None:
         logger.add(sys.stderr, level="INFO")
 
 
+class GitWorker:
+    """Background thread for git commits, so a slow remote does not block the caller.
+
+    Commits are applied in the order they were queued. In remote mode, pull + push run
+    once the queue is empty, so one push covers all commits queued in the meantime.
+    """
+
+    def __init__(self) -> None:
+        """Create an idle worker, its thread is started with the first commit."""
+        self._queue: queue.Queue[tuple[Repo, str, Path | None, bool]] = queue.Queue()
+        self._condition = threading.Condition()
+        self._uncommitted = 0
+        self._unpushed = 0
+        self._thread: threading.Thread | None = None
+
+    def commit(
+        self, gitrepo: "Repo", message: str, *, add_path: Path | None, add_updated: bool
+    ) -> None:
+        with self._condition:
+            self._uncommitted += 1
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="git-worker", daemon=True)
+                self._thread.start()
+                atexit.register(self.flush_at_exit)
+        self._queue.put((gitrepo, message, add_path, add_updated))
+
+    def flush(self, timeout: float | None = None) -> bool:
+        """Block until all commits are committed and pushed, False on timeout."""
+        with self._condition:
+            return self._condition.wait_for(
+                lambda: self._uncommitted == 0 and self._unpushed == 0, timeout=timeout
+            )
+
+    def flush_at_exit(self) -> None:
+        if not self.flush(timeout=0):
+            logger.info("Waiting for git commit/push to finish...")
+        if not self.flush(timeout=GIT_FLUSH_TIMEOUT):
+            logger.warning(
+                f"Git commit/push did not finish within {GIT_FLUSH_TIMEOUT}s, giving up"
+            )
+
+    def _run(self) -> None:
+        while True:
+            gitrepo, message, add_path, add_updated = self._queue.get()
+            try:
+                if add_path is not None:
+                    gitrepo.index.add(str(add_path))
+                if add_updated:
+                    gitrepo.git.add(update=True)
+                gitrepo.index.commit(message)
+                is_committed = True
+            except Exception as e:  # noqa: BLE001
+                logger.error(f"Git commit '{message}' failed: {e}")
+                is_committed = False
+            with self._condition:
+                self._uncommitted -= 1
+                self._unpushed += is_committed
+                self._condition.notify_all()
+            if self._queue.empty() and self._unpushed:
+                self._push(gitrepo)
+
+    def _push(self, gitrepo: "Repo") -> None:
+        try:
+            if os.getenv("CCC_GIT_MODE") == "remote" and "origin" in gitrepo.remotes:
+                gitrepo.remotes.origin.pull(rebase=True)
+                gitrepo.remotes.origin.push()
+        except Exception as e:  # noqa: BLE001
+            logger.warning(f"Git pull/push failed, commits are only local: {e}")
+        with self._condition:
+            self._unpushed = 0
+            self._condition.notify_all()
+
+
+GIT_WORKER = GitWorker()
+
+
 def commit(
-    gitrepo: Repo | None, message: str, *, add_path: Path | None, add_updated: bool = False
+    gitrepo: "Repo | None", message: str, *, add_path: Path | None, add_updated: bool = False
 ) -> None:
-    """Commit changes if gitrepo is set."""
+    """Commit changes if gitrepo is set.
+
+    The commit (and pull + push in remote mode) is done by the background GIT_WORKER.
+    """
     if gitrepo is None:
         return
-    if add_path is not None:
-        gitrepo.index.add(str(add_path))
-    if add_updated:
-        gitrepo.git.add(update=True)
-    gitrepo.index.commit(message)
-    if os.getenv("CCC_GIT_MODE") == "remote" and "origin" in gitrepo.remotes:
-        gitrepo.remotes.origin.pull(rebase=True)
-        gitrepo.remotes.origin.push()
+    GIT_WORKER.commit(gitrepo, message, add_path=add_path, add_updated=add_updated)
+
+
+def latest_level_path() -> Path | None:
+    """Return the directory of the highest level present locally, if any."""
+    max_level_present = max(
+        (
+            int(Path(lname).parts[-1][len("level") :])
+            for lname in glob(f"{ROOT_DIR.absolute()}/level[0-9]")
+            + glob(f"{ROOT_DIR.absolute()}/level[0-9][0-9]")
+        ),
+        default=None,
+    )
+    return None if max_level_present is None else ROOT_DIR / f"level{max_level_present}"
+
+
+@functools.cache
+def open_repo(path: Path) -> "Repo":
+    """Repo objects are reused, a long running process keeps its git processes open."""
+    from git import Repo
+
+    return Repo(path)
 
 
-def get_git_repo(*, dirty_check: bool) -> Repo | None:
+def get_git_repo(*, dirty_check: bool) -> "Repo | None":
     """Check to see if git mode is enabled, return Repo if it is.
 
     Also check to see if repo is not a bare repo and not dirty
     """
     if os.getenv("CCC_GIT_MODE") == "none":
         return None
-    gitrepo = Repo(ROOT_DIR.parent)
+    gitrepo = open_repo(ROOT_DIR.parent)
     if gitrepo.bare:
         logger.error(f"Git repo in {ROOT_DIR.parent.absolute()} is a bare repo")
         raise typer.Exit(code=1)
+    # queued commits and a pull --rebase in progress change the working tree, without
+    # dirty_check the commits of the caller are simply queued after them
+    if dirty_check and not GIT_WORKER.flush(timeout=GIT_FLUSH_TIMEOUT):
+        logger.warning(
+            f"Git commit/push did not finish within {GIT_FLUSH_TIMEOUT}s, "
+            "checking for changes anyway"
+        )
     if dirty_check and gitrepo.is_dirty():
         logger.error(f"Git repo {ROOT_DIR.parent.absolute()} is dirty, commit your changes!")
         raise typer.Exit(code=1)
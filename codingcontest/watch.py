@@ -0,0 +1,145 @@
+import functools
+import hashlib
+import time
+from pathlib import Path
+
+import typer
+from loguru import logger
+
+from codingcontest import client
+from codingcontest.catcoder import CatCoder
+from codingcontest.harness import SOLVER_FILENAME, solve_in_parallel, solve_with_level_solver
+from codingcontest.ledger import SubmissionLedger
+from codingcontest.submit_solutions import submit_solutions
+from codingcontest.utils import ROOT_DIR, latest_level_path, set_logging
+
+
+def watch_cli(
+    verbose: bool = typer.Option(False, "--verbose", "-v"),  # noqa: B008, FBT001, FBT003
+    interval: float = typer.Option(  # noqa: B008
+        0.5, help="Seconds between checks for changed files"
+    ),
+    timeout: float = typer.Option(  # noqa: B008
+        60.0, help="Seconds allowed for solving one input"
+    ),
+    pattern: str = typer.Option(  # noqa: B008
+        "*.in", help="Glob for the input files in in/ to solve, e.g. '*_example.in'"
+    ),
+    submit: bool = typer.Option(  # noqa: B008, FBT001
+        default=True, help="Submit outputs which changed"
+    ),
+) -> None:
+    """Re-solve the inputs of the current level whenever the solver or an input changes.
+
+    The solve_file function of solve.py in the level directory is used. Outputs whose
+    content changed are submitted (with submit-solutions --only-for-stage).
+    """
+    set_logging(verbose=verbose)
+    try:
+        watch(interval=interval, timeout=timeout, pattern=pattern, submit=submit)
+    except KeyboardInterrupt:
+        logger.info("Stopped watching")
+
+
+def watch(*, interval: float, timeout: float, pattern: str, submit: bool) -> None:
+    catcoder = None if not submit or client.is_daemon_running() else CatCoder()
+    watcher: LevelWatcher | None = None
+    while True:
+        level_path = latest_level_path()
+        if level_path is None:
+            logger.error("No level directory found, run next-level first")
+            raise typer.Exit(code=1)
+        if watcher is None or watcher.level_path != level_path:
+            logger.info(f"Watching {level_path.relative_to(ROOT_DIR)} for changes")
+            watcher = LevelWatcher(level_path, pattern=pattern)
+        if (affected := watcher.affected_inputs()) and watcher.is_solver_valid():
+            solved = solve_in_parallel(
+                functools.partial(solve_with_level_solver, str(level_path / SOLVER_FILENAME)),
+                [str(inputfile) for inputfile in affected],
+                timeout=timeout,
+            )
+            for stage in watcher.changed_outputs(solved):
+                if not submit:
+                    logger.info(f"{stage} output changed")
+                elif latest_level_path() == level_path:  # not if the level is complete
+                    submit_stage(stage, catcoder=catcoder)
+        time.sleep(interval)
+
+
+class LevelWatcher:
+    """Tracks which inputs of a level need to be solved again and which outputs changed.
+
+    A change of any .py file in the level directory affects all inputs, a changed input
+    file only itself. For each input the hash of its last output is kept.
+    """
+
+    def __init__(self, level_path: Path, *, pattern: str) -> None:
+        """Track the inputs of level_path matching pattern, all need to be solved at first."""
+        self.level_path = level_path
+        self.pattern = pattern
+        self.sources_digest = ""
+        self.input_stamps: dict[Path, tuple[int, int]] = {}  # input -> (mtime_ns, size)
+        self.output_digests: dict[str, str] = {}  # input stem -> sha256 of its output
+
+    def affected_inputs(self) -> list[Path]:
+        sources_digest = hashlib.sha256()
+        for source_path in sorted(self.level_path.glob("*.py")):
+            sources_digest.update(source_path.name.encode() + source_path.read_bytes())
+        input_stamps = {}
+        for input_path in sorted((self.level_path / "in").glob(self.pattern)):
+            stat = input_path.stat()
+            input_stamps[input_path] = (stat.st_mtime_ns, stat.st_size)
+        if sources_digest.hexdigest() != self.sources_digest:
+            affected = list(input_stamps)
+        else:
+            affected = [
+                input_path
+                for input_path, stamp in input_stamps.items()
+                if self.input_stamps.get(input_path) != stamp
+            ]
+        self.sources_digest = sources_digest.hexdigest()
+        self.input_stamps = input_stamps
+        return affected
+
+    def is_solver_valid(self) -> bool:
+        """Check for syntax errors once, instead of failing in every worker."""
+        solver_path = self.level_path / SOLVER_FILENAME
+        try:
+            compile(solver_path.read_bytes(), str(solver_path), "exec")
+        except (OSError, SyntaxError, ValueError) as e:
+            logger.error(f"Cannot use {solver_path.relative_to(ROOT_DIR)}: {e}")
+            return False
+        return True
+
+    def changed_outputs(self, solved: dict[str, bool]) -> list[str]:
+        """Return the stems of solved inputs whose output differs from the last one."""
+        changed = []
+        for stem, is_solved in sorted(solved.items()):
+            output_path = self.level_path / "out" / f"{stem}.out"
+            if not is_solved or not output_path.exists():
+                continue
+            digest = SubmissionLedger.digest(output_path)
+            if self.output_digests.get(stem) != digest:
+                self.output_digests[stem] = digest
+                changed.append(stem)
+        return changed
+
+
+def submit_stage(stage: str, *, catcoder: CatCoder | None) -> None:
+    """Submit the output of stage, via the contest daemon if it is running."""
+    if client.call("submit-solutions", ["--only-for-stage", stage]) is not None:
+        return
+    try:
+        submit_solutions(only_for_stage=stage, catcoder=catcoder)
+    except typer.Exit:
+        pass  # the verdicts are logged by submit_solutions
+    except Exception:
+        logger.exception(f"Submitting {stage} failed")
+
+
+def run() -> None:
+    typer.run(watch_cli)
+
+
+if __name__ == "__main__":
+    run()